@@ -0,0 +1,38 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of follow/unfollow requests allowed in flight at once (1 disables the engine)
+MUTATION_CONCURRENCY = int(os.getenv('MUTATION_CONCURRENCY', '4'))
+
+async def _run_workers(users, operation_func, on_result, concurrency):
+    """Drain the user iterable with a fixed number of worker coroutines"""
+    loop = asyncio.get_running_loop()
+    numbered_users = enumerate(users, 1)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def worker():
+            # Workers share one iterator, so users are handed out in order and
+            # only `concurrency` of them are ever in flight
+            for index, user in numbered_users:
+                success = await loop.run_in_executor(executor, operation_func, user)
+                on_result(index, user, success)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+def run_user_operations(users, operation_func, on_result, concurrency=MUTATION_CONCURRENCY):
+    """
+    Run a blocking follow/unfollow function over many users concurrently
+
+    The HTTP calls run in a thread pool driven by an asyncio event loop.
+    Results are reported back on the event loop thread, so on_result never
+    runs concurrently with itself. Pacing is left to the rate-limit
+    scheduler used by operation_func, which is shared by all workers.
+
+    Args:
+        users (iterable): Usernames to process
+        operation_func (callable): Function taking a username and returning True on success
+        on_result (callable): Called as on_result(index, user, success) for every user
+        concurrency (int): Maximum number of requests in flight
+    """
+    asyncio.run(_run_workers(users, operation_func, on_result, max(1, concurrency)))
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the parts of the GitHub REST API used by F-U
+
+The server simulates accounts with any number of followers and following,
+paginated list endpoints with Link and ETag headers, follow/unfollow
+mutations, primary and secondary rate limits, and a configurable latency
+model, so the pipeline can be measured offline without spending real quota.
+
+Run it standalone and point the scripts at it:
+
+    python -m benchmarks.mock_github --followers 50000 --following 20000 --mutual 15000
+    GITHUB_API_URL=http://127.0.0.1:8765 USERNAME=octocat python follow_unfollow.py
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class LatencyModel:
+    """
+    Response delay of the mock server
+
+    Each response waits base + per_item * items, scaled by a log-normal
+    jitter factor, which gives the long tail seen on the real API.
+    """
+
+    def __init__(self, base=0.05, per_item=0.0002, jitter=0.25, seed=None):
+        self.base = base
+        self.per_item = per_item
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def delay(self, items=0):
+        """Seconds to wait before answering a response with the given number of items"""
+        delay = self.base + self.per_item * items
+        if self.jitter:
+            delay *= self._random.lognormvariate(0, self.jitter)
+        return delay
+
+class MockAccount:
+    """
+    Follower graph of one simulated account
+
+    Followers are generated deterministically and only materialised as a
+    list once. Following starts as `mutual` of the followers plus
+    `following - mutual` accounts that do not follow back, and changes
+    with every successful PUT/DELETE.
+    """
+
+    def __init__(self, username, followers, following, mutual):
+        self.username = username
+        self.followers = [f'fan{i:07d}' for i in range(followers)]
+        self.following = dict.fromkeys(self.followers[:mutual] + [f'idol{i:07d}' for i in range(following - mutual)])
+        self.version = 0
+        self.followers_version = 0
+        self._following_list = None
+
+    def list(self, endpoint):
+        """Current follower or following list, newest first"""
+        if endpoint == 'followers':
+            return self.followers
+        if self._following_list is None:
+            self._following_list = list(reversed(self.following))
+        return self._following_list
+
+    def gain_follower(self, login):
+        """A new user follows the account, it shows up first in the followers list"""
+        self.followers.insert(0, login)
+        self.followers_version += 1
+
+    def follow(self, login):
+        self.following[login] = None
+        self._changed()
+
+    def unfollow(self, login):
+        self.following.pop(login, None)
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._following_list = None
+
+class MockGitHub:
+    """
+    State of the mock API: accounts, quotas and request statistics
+
+    Args:
+        accounts (dict): username -> MockAccount
+        latency (LatencyModel): Response delay model
+        quota (int): Primary rate limit per window
+        quota_window (float): Seconds until the primary quota resets
+        secondary_per_minute (int): Mutations allowed per rolling minute before
+            secondary limits kick in (0 disables them)
+        error_rate (float): Probability that any request fails with a 502
+        throttle_rate (float): Probability that a mutation is answered with a 429
+    """
+
+    def __init__(self, accounts, latency=None, quota=5000, quota_window=3600,
+                 secondary_per_minute=80, error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.accounts = accounts
+        self.latency = latency or LatencyModel(seed=seed)
+        self.quota = quota
+        self.quota_window = quota_window
+        self.secondary_per_minute = secondary_per_minute
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._mutations = deque()
+        self.reset()
+
+    def reset(self):
+        """Reset quotas and statistics"""
+        with self._lock:
+            self.remaining = self.quota
+            self.reset_at = time.time() + self.quota_window
+            self.stats = Counter()
+            self._mutations.clear()
+
+    def rate_limit_headers(self):
+        """Primary rate-limit headers of the current window"""
+        return {
+            'X-RateLimit-Limit': str(self.quota),
+            'X-RateLimit-Remaining': str(max(self.remaining, 0)),
+            'X-RateLimit-Reset': str(int(self.reset_at))
+        }
+
+    def charge(self):
+        """
+        Count a request against the primary quota
+
+        Returns:
+            bool: False if the quota is exhausted
+        """
+        with self._lock:
+            if time.time() >= self.reset_at:
+                self.remaining = self.quota
+                self.reset_at = time.time() + self.quota_window
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def secondary_limited(self):
+        """Record a mutation and tell whether it exceeds the secondary limit"""
+        if not self.secondary_per_minute:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._mutations and self._mutations[0] < now - 60:
+                self._mutations.popleft()
+            if len(self._mutations) >= self.secondary_per_minute:
+                return True
+            self._mutations.append(now)
+            return False
+
+    def chance(self, probability):
+        with self._lock:
+            return self._random.random() < probability
+
+_LIST_PATH = re.compile(r'^/users/([^/]+)/(followers|following)$')
+_USER_PATH = re.compile(r'^/users/([^/]+)$')
+_MUTATION_PATH = re.compile(r'^/user/following/([^/]+)$')
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    """Request handler serving the mock API from the server's MockGitHub state"""
+
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def _send(self, status, body=None, headers=None, items=0):
+        time.sleep(self.api.latency.delay(items))
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for name, value in {**self.api.rate_limit_headers(), **(headers or {})}.items():
+            self.send_header(name, value)
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _account(self, username):
+        account = self.api.accounts.get(username)
+        if account is None:
+            self._send(404, {'message': 'Not Found'})
+        return account
+
+    def _preflight(self, route):
+        """Count the request and apply failure injection; returns False if a response was sent"""
+        self.api.stats[route] += 1
+        if self.api.chance(self.api.error_rate):
+            self.api.stats['injected_errors'] += 1
+            self._send(502, {'message': 'Server Error'})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/__stats':
+            self._send(200, dict(self.api.stats))
+            return
+
+        match = _LIST_PATH.match(url.path)
+        if match:
+            if not self._preflight('list'):
+                return
+            account = self._account(match.group(1))
+            if account is not None:
+                self._send_list(account, match.group(2), query)
+            return
+
+        match = _USER_PATH.match(url.path)
+        if match:
+            if not self._preflight('user'):
+                return
+            if not self.api.charge():
+                self._send_primary_limited()
+                return
+            account = self.api.accounts.get(match.group(1))
+            login = match.group(1)
+            self._send(200, {
+                'login': login,
+                'name': login.title(),
+                'public_repos': len(login),
+                'followers': len(account.followers) if account else 0,
+                'following': len(account.following) if account else 0,
+                'created_at': '2015-01-01T00:00:00Z',
+                'bio': ''
+            })
+            return
+
+        self._send(404, {'message': 'Not Found'})
+
+    def _send_list(self, account, endpoint, query):
+        per_page = min(int(query.get('per_page', ['30'])[0]), 100)
+        page = max(int(query.get('page', ['1'])[0]), 1)
+        users = account.list(endpoint)
+        last_page = max(1, -(-len(users) // per_page))
+
+        version = account.version if endpoint == 'following' else account.followers_version
+        etag = '"%s"' % hashlib.sha1(f'{account.username}/{endpoint}/{per_page}/{page}/{version}'.encode()).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            # Conditional hits do not count against the quota, like on GitHub
+            self.api.stats['not_modified'] += 1
+            self._send(304, headers={'ETag': etag})
+            return
+        if not self.api.charge():
+            self._send_primary_limited()
+            return
+
+        items = users[(page - 1) * per_page:page * per_page]
+        base = f'http://{self.headers.get("Host")}/users/{account.username}/{endpoint}?per_page={per_page}'
+        links = []
+        if page < last_page:
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+        links.append(f'<{base}&page={last_page}>; rel="last"')
+        body = [{'login': login, 'id': abs(hash(login)) % 10 ** 9} for login in items]
+        self._send(200, body, {'ETag': etag, 'Link': ', '.join(links)}, items=len(items))
+
+    def _send_primary_limited(self):
+        self.api.stats['primary_limited'] += 1
+        self._send(403, {'message': 'API rate limit exceeded'})
+
+    def _mutate(self, follow):
+        match = _MUTATION_PATH.match(urlparse(self.path).path)
+        if not match:
+            self._send(404, {'message': 'Not Found'})
+            return
+        if not self._preflight('follow' if follow else 'unfollow'):
+            return
+        if self.api.chance(self.api.throttle_rate):
+            self.api.stats['throttled'] += 1
+            self._send(429, {'message': 'Too Many Requests'}, {'Retry-After': '1'})
+            return
+        if self.api.secondary_limited():
+            self.api.stats['secondary_limited'] += 1
+            self._send(403, {'message': 'You have exceeded a secondary rate limit.'}, {'Retry-After': '5'})
+            return
+        if not self.api.charge():
+            self._send_primary_limited()
+            return
+
+        # Mutations act on the single account named by the Authorization token
+        account = self.api.accounts.get(self.headers.get('Authorization', '').replace('token ', ''))
+        account = account or next(iter(self.api.accounts.values()))
+        if follow:
+            account.follow(match.group(1))
+        else:
+            account.unfollow(match.group(1))
+        self._send(204)
+
+    def do_PUT(self):
+        self._mutate(follow=True)
+
+    def do_DELETE(self):
+        self._mutate(follow=False)
+
+def start_server(api, host='127.0.0.1', port=0):
+    """
+    Start the mock API on a background thread
+
+    Args:
+        api (MockGitHub): Server state
+        host (str): Interface to listen on
+        port (int): Port to listen on, 0 picks a free one
+
+    Returns:
+        tuple: (server, base URL)
+    """
+    server = ThreadingHTTPServer((host, port), MockGitHubHandler)
+    server.daemon_threads = True
+    server.api = api
+    threading.Thread(target=server.serve_forever, name='mock-github', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the GitHub REST API')
+    parser.add_argument('--username', default='octocat')
+    parser.add_argument('--followers', type=int, default=10000)
+    parser.add_argument('--following', type=int, default=5000)
+    parser.add_argument('--mutual', type=int, default=4000)
+    parser.add_argument('--latency', type=float, default=0.05, help='base latency per response in seconds')
+    parser.add_argument('--per-item-latency', type=float, default=0.0002)
+    parser.add_argument('--quota', type=int, default=5000)
+    parser.add_argument('--secondary-per-minute', type=int, default=80)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    account = MockAccount(args.username, args.followers, args.following, args.mutual)
+    api = MockGitHub({args.username: account}, LatencyModel(args.latency, args.per_item_latency),
+                     quota=args.quota, secondary_per_minute=args.secondary_per_minute,
+                     error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    server, url = start_server(api, port=args.port)
+    print(f"Mock GitHub API for {args.username} listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
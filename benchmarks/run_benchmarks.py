@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark the follow/unfollow pipeline against the local mock GitHub API
+
+Each phase of a run (cold list fetch, ETag-revalidated list fetch, diff and
+mutations) is timed, and the API requests it sent and the peak Python heap
+it allocated are reported, so changes to the pipeline can be compared on
+the same simulated account:
+
+    python -m benchmarks.run_benchmarks --followers 100000 --following 40000 --mutual 30000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_github import LatencyModel, MockAccount, MockGitHub, start_server
+
+# Server counters that correspond to API requests
+REQUEST_COUNTERS = ('list', 'user', 'follow', 'unfollow')
+
+def _max_rss_mb():
+    """Peak resident set size of the process in MB, None where unsupported"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+class PhaseTimer:
+    """Measure wall time, API requests and peak heap of benchmark phases"""
+
+    def __init__(self, api, quiet=True):
+        self.api = api
+        self.quiet = quiet
+        self.results = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        requests_before = sum(self.api.stats[key] for key in REQUEST_COUNTERS)
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if self.quiet else sys.stdout):
+            yield
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        rss = _max_rss_mb()
+        self.results.append({
+            'phase': name,
+            'seconds': round(elapsed, 3),
+            'requests': sum(self.api.stats[key] for key in REQUEST_COUNTERS) - requests_before,
+            'peak_heap_mb': round(peak / (1024 * 1024), 2),
+            'max_rss_mb': rss and round(rss, 1)
+        })
+
+    def print_table(self):
+        print(f"{'phase':<20}{'seconds':>10}{'requests':>10}{'heap MB':>10}{'RSS MB':>10}")
+        for row in self.results:
+            print(f"{row['phase']:<20}{row['seconds']:>10.3f}{row['requests']:>10}"
+                  f"{row['peak_heap_mb']:>10.2f}{row['max_rss_mb'] or 0:>10.1f}")
+
+def run(args):
+    account = MockAccount(args.username, args.followers, args.following, args.mutual)
+    api = MockGitHub({args.username: account}, LatencyModel(args.latency, args.per_item_latency, seed=args.seed),
+                     quota=args.quota, secondary_per_minute=args.secondary_per_minute,
+                     error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=args.seed)
+    server, url = start_server(api)
+
+    # The scripts read their configuration at import time
+    os.environ.update({
+        'GITHUB_API_URL': url,
+        'TOKEN': args.username,
+        'USERNAME': args.username,
+        'CACHE_DIR': tempfile.mkdtemp(prefix='fu-bench-'),
+        'MUTATION_RATE': str(args.mutation_rate),
+        'MUTATION_BURST': str(args.mutation_rate),
+        'DISCORD_WEBHOOK_URL': ''
+    })
+    os.environ.pop('INCREMENTAL_SYNC', None)
+    import follow_unfollow
+    from snapshot import FollowSnapshot
+
+    tracemalloc.start()
+    timer = PhaseTimer(api, quiet=not args.verbose)
+
+    with timer.phase('fetch (cold)'):
+        snapshot = FollowSnapshot.fetch(follow_unfollow.get_followers, follow_unfollow.get_following)
+    with timer.phase('fetch (etag)'):
+        snapshot = FollowSnapshot.fetch(follow_unfollow.get_followers, follow_unfollow.get_following)
+    with timer.phase('diff'):
+        to_follow, to_unfollow = snapshot.diff()
+    if args.mutations:
+        with timer.phase('mutate'):
+            follow_unfollow.process_user_list(to_follow[:args.mutations // 2], "follow")
+            follow_unfollow.process_user_list(to_unfollow[:args.mutations - args.mutations // 2], "unfollow")
+
+    tracemalloc.stop()
+    server.shutdown()
+    follow_unfollow.get_default_account().client.close()
+
+    return {
+        'account': {'followers': args.followers, 'following': args.following, 'mutual': args.mutual,
+                    'to_follow': len(to_follow), 'to_unfollow': len(to_unfollow)},
+        'server': dict(api.stats),
+        'phases': timer.results
+    }, timer
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark F-U against a local mock GitHub API')
+    parser.add_argument('--username', default='octocat')
+    parser.add_argument('--followers', type=int, default=10000)
+    parser.add_argument('--following', type=int, default=5000)
+    parser.add_argument('--mutual', type=int, default=4000)
+    parser.add_argument('--mutations', type=int, default=200, help='follow/unfollow requests to send (0 skips the phase)')
+    parser.add_argument('--mutation-rate', type=float, default=500, help='MUTATION_RATE used for the run')
+    parser.add_argument('--latency', type=float, default=0.02, help='base latency per response in seconds')
+    parser.add_argument('--per-item-latency', type=float, default=0.0001)
+    parser.add_argument('--quota', type=int, default=100000)
+    parser.add_argument('--secondary-per-minute', type=int, default=0, help='mutations per minute before 403s (0 = off)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the scripts')
+    args = parser.parse_args()
+
+    results, timer = run(args)
+    timer.print_table()
+    print(f"Server: {json.dumps(results['server'], sort_keys=True)}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
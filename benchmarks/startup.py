@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Measure the startup cost of every CLI subcommand
+
+Each subcommand is loaded in a fresh interpreter, which imports exactly the
+modules it needs. The time to import them, the wall time of the whole
+process, its peak RSS and the heavy libraries it pulled in are reported,
+so a change that drags plotting libraries into the follow/unfollow path
+shows up right away:
+
+    python -m benchmarks.startup --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cli import COMMANDS
+
+# Libraries whose import is worth keeping out of the light subcommands
+HEAVY_MODULES = ('numpy', 'networkx', 'matplotlib', 'plotly', 'PIL', 'pandas')
+
+# Runs in the child interpreter: load one subcommand and report what it cost
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import cli
+cli.load(sys.argv[1])
+seconds = time.perf_counter() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+except ImportError:  # Windows
+    rss = None
+heavy = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+print(json.dumps({'import_seconds': seconds, 'max_rss_mb': rss, 'heavy': heavy}))
+"""
+
+def measure(command, repeat=3):
+    """
+    Load a subcommand in fresh interpreters and keep the fastest run
+
+    Args:
+        command (str): Subcommand name
+        repeat (int): Number of interpreters started
+
+    Returns:
+        dict: Import and process wall time in seconds, peak RSS in MB and heavy modules imported
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', _PROBE, command, json.dumps(HEAVY_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        wall = time.perf_counter() - start
+        result = json.loads(output.strip().splitlines()[-1])
+        result['process_seconds'] = wall
+        if best is None or wall < best['process_seconds']:
+            best = result
+    return {
+        'command': command,
+        'import_seconds': round(best['import_seconds'], 3),
+        'process_seconds': round(best['process_seconds'], 3),
+        'max_rss_mb': best['max_rss_mb'] and round(best['max_rss_mb'], 1),
+        'heavy_modules': best['heavy']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure startup time and memory of the CLI subcommands')
+    parser.add_argument('commands', nargs='*', default=list(COMMANDS), help='subcommands to measure (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='interpreters started per subcommand, the fastest counts')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = [measure(command, args.repeat) for command in args.commands]
+    print(f"{'command':<12}{'import s':>10}{'process s':>11}{'RSS MB':>9}  heavy modules")
+    for row in results:
+        print(f"{row['command']:<12}{row['import_seconds']:>10.3f}{row['process_seconds']:>11.3f}"
+              f"{row['max_rss_mb'] or 0:>9.1f}  {', '.join(row['heavy_modules']) or '-'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
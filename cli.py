@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Command line entry point for F-U
+
+Each subcommand imports only the modules its stage needs, so following and
+unfollowing never pays for the plotting libraries:
+
+    python cli.py sync        # follow back and unfollow, like follow_unfollow.py
+    python cli.py follow      # only follow back
+    python cli.py unfollow    # only unfollow non-followers
+    python cli.py snapshot    # save today's lists to the snapshot history
+    python cli.py render      # snapshot and render the network visualizations
+    python cli.py report      # print the changes between two snapshot days
+"""
+
+import argparse
+import importlib
+
+# Subcommand -> (module, function, help text)
+COMMANDS = {
+    'sync': ('follow_unfollow', 'main', 'Follow back your followers and unfollow non-followers'),
+    'follow': ('follow_unfollow', 'main', 'Only follow back your followers'),
+    'unfollow': ('follow_unfollow', 'main', 'Only unfollow users who do not follow you back'),
+    'snapshot': ('network_visualization', 'snapshot_main', "Save today's followers and following to the snapshot history"),
+    'render': ('network_visualization', 'main', 'Save a snapshot and render the network visualizations'),
+    'report': ('network_visualization', 'report_main', 'Print how your network changed between two snapshot days')
+}
+
+# Operations run by the follow/unfollow subcommands
+OPERATIONS = {'sync': ('follow', 'unfollow'), 'follow': ('follow',), 'unfollow': ('unfollow',)}
+
+def load(command):
+    """
+    Import the module of a subcommand and return its entry function
+
+    Args:
+        command (str): Subcommand name
+
+    Returns:
+        callable: The function running the subcommand
+    """
+    module, function, _ = COMMANDS[command]
+    return getattr(importlib.import_module(module), function)
+
+def build_parser():
+    """Build the argument parser with one subparser per command"""
+    parser = argparse.ArgumentParser(prog='fu', description='GitHub follow & unfollow automation')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command, (_, _, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(command, help=help_text, description=help_text)
+        if command == 'report':
+            subparser.add_argument('--since', help='earlier day as YYYY-MM-DD (default: the snapshot before the latest)')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    run = load(args.command)
+    if args.command in OPERATIONS:
+        run(OPERATIONS[args.command])
+    elif args.command == 'report':
+        run(args.since)
+    else:
+        run()
+
+if __name__ == "__main__":
+    main()
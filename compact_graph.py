@@ -0,0 +1,184 @@
+import numpy as np
+
+# Largest graph converted to networkx by default, bigger views should be reduced with subgraph() first
+NETWORKX_MAX_NODES = 5000
+
+class CompactGraph:
+    """
+    Directed follow graph stored as integer ids and CSR adjacency arrays
+
+    Logins are interned to ids in the order they are first seen. An edge
+    (a, b) means a follows b; the successors of node i are
+    indices[indptr[i]:indptr[i + 1]], sorted. This takes a few bytes per
+    node and edge instead of the hundreds a networkx graph of login strings
+    needs, and classification and degree statistics run as NumPy array
+    operations.
+    """
+
+    def __init__(self, logins, indptr, indices):
+        self._logins = list(logins)
+        self._ids = {login: i for i, login in enumerate(self._logins)}
+        self.indptr = indptr
+        self.indices = indices
+        self._reverse = None
+
+    @classmethod
+    def from_edges(cls, edges, logins=()):
+        """
+        Build a graph from (follower, followed) login pairs
+
+        Args:
+            edges (iterable): (follower, followed) pairs
+            logins (iterable): Logins interned first, so they get the lowest ids in this order
+
+        Returns:
+            CompactGraph: The graph, duplicate edges removed
+        """
+        ids = {}
+        for login in logins:
+            ids.setdefault(login, len(ids))
+        sources, targets = [], []
+        for source, target in edges:
+            sources.append(ids.setdefault(source, len(ids)))
+            targets.append(ids.setdefault(target, len(ids)))
+        return cls._from_arrays(list(ids), np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64))
+
+    @classmethod
+    def from_network(cls, username, followers, following, crawl_edges=None):
+        """
+        Build the graph of an account from its lists and optional crawled edges
+
+        The account gets id 0, followers come next in API order, then users
+        only in following, so id order matches the order of the lists. The
+        account's own edges come from the lists alone, crawled edges touching
+        it may be older than the lists and are left out, so classify(0)
+        always agrees with them.
+        """
+        edges = [(user, username) for user in followers]
+        edges += [(username, user) for user in following]
+        edges += [edge for edge in crawl_edges or [] if username not in edge]
+        return cls.from_edges(edges, [username] + list(followers) + list(following))
+
+    @classmethod
+    def _from_arrays(cls, logins, sources, targets):
+        """Build the CSR arrays from parallel edge arrays"""
+        count = len(logins)
+        keys = np.unique(sources.astype(np.int64) * count + targets)
+        sources, targets = keys // count, keys % count
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=count), out=indptr[1:])
+        return cls(logins, indptr, targets.astype(np.int32))
+
+    def number_of_nodes(self):
+        return len(self._logins)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def ids(self, logins):
+        """Ids of logins as an array"""
+        return np.array([self._ids[login] for login in logins], dtype=np.int32)
+
+    def logins(self, ids):
+        """Logins of ids as a list"""
+        return [self._logins[i] for i in ids]
+
+    def successors(self, node):
+        """Sorted ids of the users a node follows"""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def _sources(self):
+        """Source id of every edge, parallel to indices"""
+        return np.repeat(np.arange(self.number_of_nodes(), dtype=np.int32), np.diff(self.indptr))
+
+    def reverse(self):
+        """Graph with every edge reversed, so successors become followers"""
+        if self._reverse is None:
+            self._reverse = CompactGraph._from_arrays(self._logins, self.indices, self._sources())
+            self._reverse._reverse = self
+        return self._reverse
+
+    def predecessors(self, node):
+        """Sorted ids of the users following a node"""
+        return self.reverse().successors(node)
+
+    def classify(self, node=0):
+        """
+        Split the neighbours of a node by relationship
+
+        Returns:
+            dict: 'mutual', 'follower' and 'following' -> sorted id arrays
+        """
+        following = self.successors(node)
+        followers = self.predecessors(node)
+        return {
+            'mutual': np.intersect1d(followers, following, assume_unique=True),
+            'follower': np.setdiff1d(followers, following, assume_unique=True),
+            'following': np.setdiff1d(following, followers, assume_unique=True)
+        }
+
+    def reciprocal(self):
+        """Boolean array parallel to indices, True where the edge is returned"""
+        count = self.number_of_nodes()
+        sources = self._sources().astype(np.int64)
+        # CSR order is sorted by (source, target), so edge keys are already sorted
+        keys = sources * count + self.indices
+        reverse_keys = self.indices.astype(np.int64) * count + sources
+        position = np.minimum(np.searchsorted(keys, reverse_keys), max(len(keys) - 1, 0))
+        return keys[position] == reverse_keys if len(keys) else np.zeros(0, dtype=bool)
+
+    def in_degree(self):
+        """Number of followers of every node within the graph, as an array indexed by id"""
+        return np.bincount(self.indices, minlength=self.number_of_nodes())
+
+    def degree_stats(self):
+        """
+        Summary statistics of the graph
+
+        Returns:
+            dict: Node and edge counts, reciprocity, and mean/median/max in- and out-degree
+        """
+        out_degree = np.diff(self.indptr)
+        in_degree = self.in_degree()
+        stats = {
+            'nodes': self.number_of_nodes(),
+            'edges': self.number_of_edges(),
+            'reciprocity': round(float(self.reciprocal().mean()), 4) if self.number_of_edges() else 0.0
+        }
+        for name, degree in (('out_degree', out_degree), ('in_degree', in_degree)):
+            stats[name] = {
+                'mean': round(float(degree.mean()), 3) if len(degree) else 0.0,
+                'median': float(np.median(degree)) if len(degree) else 0.0,
+                'max': int(degree.max()) if len(degree) else 0
+            }
+        return stats
+
+    def subgraph(self, nodes):
+        """
+        Induced subgraph on a set of node ids
+
+        Returns:
+            CompactGraph: Graph with ids renumbered in the order of the sorted input ids
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int32))
+        mapping = np.full(self.number_of_nodes(), -1, dtype=np.int32)
+        mapping[nodes] = np.arange(len(nodes), dtype=np.int32)
+        sources = mapping[self._sources()]
+        targets = mapping[self.indices]
+        keep = (sources >= 0) & (targets >= 0)
+        return CompactGraph._from_arrays(self.logins(nodes), sources[keep], targets[keep])
+
+    def to_networkx(self, max_nodes=NETWORKX_MAX_NODES):
+        """
+        Convert to a networkx DiGraph of logins, for small views only
+
+        Raises:
+            ValueError: If the graph has more than max_nodes nodes
+        """
+        if self.number_of_nodes() > max_nodes:
+            raise ValueError(f'Graph has {self.number_of_nodes()} nodes, take a subgraph of at most {max_nodes} first')
+        import networkx as nx
+        G = nx.DiGraph()
+        G.add_nodes_from(self._logins)
+        G.add_edges_from(zip(self.logins(self._sources()), self.logins(self.indices)))
+        return G
@@ -0,0 +1,157 @@
+import os
+import time
+import signal
+import threading
+from collections import deque
+import requests
+from follow_unfollow import GITHUB_USERNAME, get_default_account, get_followers, get_following, process_user_list
+from github_api import GitHubAPIError
+from incremental_sync import INCREMENTAL_SYNC
+from metrics import metrics
+from notifications import flush_notifications, send_follow_report
+from snapshot import FollowSnapshot
+
+# Shortest wait between two polls, used right after a change was seen
+DAEMON_MIN_INTERVAL = float(os.getenv('DAEMON_MIN_INTERVAL', '60'))
+# Longest wait between two polls once the account has been idle for a while
+DAEMON_MAX_INTERVAL = float(os.getenv('DAEMON_MAX_INTERVAL', '1800'))
+# Hours between full fetches of both lists, which catch unfollows and changes beyond the first page
+DAEMON_FULL_SYNC_HOURS = float(os.getenv('DAEMON_FULL_SYNC_HOURS', '24'))
+# Follow/unfollow requests processed per poll, the rest waits for the next one
+DAEMON_BATCH_SIZE = int(os.getenv('DAEMON_BATCH_SIZE', '20'))
+
+# Page size of the follower poll, the same as get_followers so the first page shares its cache entry
+POLL_PER_PAGE = 110
+
+class FollowDaemon:
+    """
+    Long-running follow/unfollow loop for the configured account
+
+    The process keeps its pooled connections and a snapshot of both lists
+    in memory. Between full syncs it only polls the first follower page
+    with a conditional request, which is answered with 304 Not Modified
+    while nothing changed and does not count against the rate limit. New
+    followers are queued right away, the poll interval drops to the
+    minimum after a change and doubles on every idle poll up to the
+    maximum. Queued users are processed in small batches through the
+    regular follow/unfollow processing, one batch per poll.
+    """
+
+    def __init__(self, min_interval=DAEMON_MIN_INTERVAL, max_interval=DAEMON_MAX_INTERVAL,
+                 full_sync_hours=DAEMON_FULL_SYNC_HOURS, batch_size=DAEMON_BATCH_SIZE):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.full_sync_interval = full_sync_hours * 3600
+        self.batch_size = max(1, batch_size)
+        self.interval = min_interval
+        self.snapshot = None
+        self.first_page = None
+        self.last_full_sync = None
+        # (operation_type, user) pairs waiting to be processed
+        self.pending = deque()
+        self.account = get_default_account()
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        """Ask the loop to exit after the current step"""
+        self._stop.set()
+
+    def full_sync(self):
+        """Fetch both lists and queue every user the diff finds"""
+        with metrics.stage('fetch'):
+            self.snapshot = FollowSnapshot.fetch(get_followers, get_following)
+        self.first_page = None
+        self.last_full_sync = time.monotonic()
+        with metrics.stage('diff'):
+            to_follow, to_unfollow = self.snapshot.diff()
+        self.pending = deque([("follow", user) for user in to_follow] + [("unfollow", user) for user in to_unfollow])
+        self.account.client.save_cache()
+        print(f"Full sync: {len(to_follow)} to follow, {len(to_unfollow)} to unfollow")
+
+    def poll(self):
+        """
+        Revalidate the first follower page and queue new followers
+
+        Returns:
+            bool: True if the page changed since the previous poll
+        """
+        with metrics.stage('poll'):
+            logins = self.account.client.fetch_page(GITHUB_USERNAME, 'followers', POLL_PER_PAGE, 1)
+        changed = self.first_page is not None and logins != self.first_page
+        self.first_page = logins
+        new = [user for user in logins if user not in self.snapshot.followers]
+        if new and len(new) == len(logins):
+            # The whole page is new, there may be more beyond it
+            print("First follower page is all new, doing a full sync")
+            self.full_sync()
+            return True
+        for user in reversed(new):
+            self.snapshot.followers[user] = None
+            if user not in self.snapshot.following:
+                self.pending.appendleft(("follow", user))
+        if new:
+            print(f"{len(new)} new followers: {', '.join(new)}")
+        return changed or bool(new)
+
+    def process_batch(self):
+        """Process up to batch_size queued users and report them"""
+        batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+        followed = len(self.snapshot.followed)
+        unfollowed = len(self.snapshot.unfollowed)
+        # Skip users whose state changed since they were queued
+        to_follow = [user for operation, user in batch
+                     if operation == "follow" and user not in self.snapshot.following]
+        to_unfollow = [user for operation, user in batch
+                       if operation == "unfollow" and user in self.snapshot.following and user not in self.snapshot.followers]
+        if to_follow:
+            process_user_list(to_follow, "follow", snapshot=self.snapshot)
+        if to_unfollow:
+            process_user_list(to_unfollow, "unfollow", snapshot=self.snapshot)
+        if not (to_follow or to_unfollow):
+            return
+        send_follow_report()
+        # Keep the stored following list in step with the mutations
+        if INCREMENTAL_SYNC:
+            self.account.delta_sync.record_mutations(self.snapshot.followed[followed:], self.snapshot.unfollowed[unfollowed:])
+
+    def step(self):
+        """Run one poll and batch, then adapt the poll interval"""
+        if self.snapshot is None or time.monotonic() - self.last_full_sync >= self.full_sync_interval:
+            self.full_sync()
+            changed = True
+        else:
+            changed = self.poll()
+        if self.pending:
+            self.process_batch()
+        if changed or self.pending:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+
+    def run(self):
+        """Poll until stopped, a failed step is retried after the maximum interval"""
+        print(f"Watching {GITHUB_USERNAME}, polling every {self.min_interval:.0f}-{self.max_interval:.0f}s")
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except (GitHubAPIError, requests.RequestException, ValueError) as e:
+                # Error responses such as rate limits or an expired token included,
+                # the daemon backs off and keeps running
+                print(f"Daemon step failed: {e}")
+                self.interval = self.max_interval
+            # Totals since the daemon started, refreshed after every poll
+            flush_notifications()
+            metrics.export('daemon')
+            self._stop.wait(self.interval)
+        self.account.client.save_cache()
+        print("Daemon stopped.")
+
+def main():
+    """Run the daemon until SIGINT or SIGTERM"""
+    daemon = FollowDaemon()
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from metrics import metrics
+
+# Seconds the dispatcher waits for more messages to coalesce into one post
+DISCORD_BATCH_WINDOW = float(os.getenv('DISCORD_BATCH_WINDOW', '1.0'))
+# Seconds to wait for queued messages to be delivered when the process exits
+DISCORD_FLUSH_TIMEOUT = float(os.getenv('DISCORD_FLUSH_TIMEOUT', '60'))
+
+# Discord webhook limits
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBED_DESCRIPTION = 4096
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_TOTAL = 6000
+
+def _embed_size(embed):
+    """Characters of an embed that count towards Discord's per-message total"""
+    # Discord counts the title, description, field names and values, footer text and author name
+    size = len(embed.get('title', '')) + len(embed.get('description', ''))
+    size += sum(len(field.get('name', '')) + len(field.get('value', '')) for field in embed.get('fields', []))
+    size += len(embed.get('footer', {}).get('text', '')) + len(embed.get('author', {}).get('name', ''))
+    return size
+
+class DiscordDispatcher:
+    """
+    Deliver webhook messages from a background thread
+
+    Callers only enqueue messages, so they never wait on webhook latency.
+    Messages queued within the batch window are coalesced into as few posts
+    as Discord's size limits allow. The worker honours the rate-limit bucket
+    headers and retries after the Retry-After delay of a 429 response.
+    """
+
+    def __init__(self, webhook_url, session, timeout=30, batch_window=DISCORD_BATCH_WINDOW, max_retries=5):
+        self.webhook_url = webhook_url
+        self.session = session
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        atexit.register(self.flush, DISCORD_FLUSH_TIMEOUT)
+
+    def send(self, content, embeds=None, files=None):
+        """
+        Queue a message for delivery
+
+        Args:
+            content (str): Message text
+            embeds (list): Optional embed objects
+            files (dict): Optional attachments as filename -> bytes; such messages are not coalesced
+        """
+        if not self.webhook_url:
+            print("DISCORD_WEBHOOK_URL is not set, skipping Discord message")
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='discord-dispatcher', daemon=True)
+                self._thread.start()
+        self._queue.put({'content': content, 'embeds': list(embeds or []), 'files': files})
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued message has been delivered or dropped
+
+        Args:
+            timeout (float): Maximum seconds to wait, None waits indefinitely
+
+        Returns:
+            bool: True if the queue was drained in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"Gave up waiting for {self._queue.unfinished_tasks} Discord messages")
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        """Worker loop: take a message, gather what arrives within the batch window, post"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while not batch[-1]['files']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            for message in self._coalesce(batch):
+                try:
+                    # Delivery, rate-limit waits and retries included, is the run's notify stage
+                    with metrics.stage('notify'):
+                        self._post(message)
+                except Exception as e:
+                    print(f"Failed to send Discord message: {e}")
+            for _ in batch:
+                self._queue.task_done()
+
+    def _coalesce(self, batch):
+        """Merge queued messages into as few posts as the size limits allow"""
+        merged = []
+        for message in batch:
+            current = merged[-1] if merged else None
+            if (current is not None and not current['files'] and not message['files']
+                    and len(current['content']) + len(message['content']) + 1 <= MAX_CONTENT_LENGTH
+                    and len(current['embeds']) + len(message['embeds']) <= MAX_EMBEDS_PER_MESSAGE
+                    and sum(map(_embed_size, current['embeds'] + message['embeds'])) <= MAX_EMBED_TOTAL):
+                current['content'] = '\n'.join(filter(None, [current['content'], message['content']]))
+                current['embeds'].extend(message['embeds'])
+            else:
+                merged.append(dict(message, embeds=list(message['embeds'])))
+        return merged
+
+    def _wait_for_bucket(self):
+        """Sleep until the webhook's rate-limit bucket allows another request"""
+        delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _post(self, message):
+        """Post one message, retrying on 429 responses"""
+        payload = {'content': message['content']}
+        if message['embeds']:
+            payload['embeds'] = message['embeds']
+
+        for _ in range(self.max_retries):
+            self._wait_for_bucket()
+            if message['files']:
+                files = {f'files[{i}]': (name, data) for i, (name, data) in enumerate(message['files'].items())}
+                response = self.session.post(self.webhook_url, data={'payload_json': json.dumps(payload)},
+                                             files=files, timeout=self.timeout)
+            else:
+                response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+
+            # Pause before the next request once the bucket is used up
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                reset_after = float(response.headers.get('X-RateLimit-Reset-After', 1))
+                self._blocked_until = time.monotonic() + reset_after
+
+            if response.status_code == 429:
+                retry_after = response.headers.get('Retry-After')
+                if retry_after is None:
+                    retry_after = response.json().get('retry_after', 1)
+                print(f"Discord rate limit hit, retrying in {float(retry_after):.1f}s")
+                self._blocked_until = time.monotonic() + float(retry_after)
+                continue
+
+            if response.status_code not in (200, 204):
+                print(f"Failed to send Discord report. Status code: {response.status_code}")
+                return False
+            print("Discord report sent successfully")
+            return True
+        print("Failed to send Discord report after repeated rate limiting")
+        return False
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+
+# Maximum number of logins listed per report category, counts are always exact
+REPORT_MAX_USERS = int(os.getenv('REPORT_MAX_USERS', '1000'))
+
+# Report categories in display order: (key, summary label)
+REPORT_CATEGORIES = [
+    ("followed", "Followed"),
+    ("unfollowed", "Unfollowed"),
+    ("failed_follows", "Failed to follow"),
+    ("failed_unfollows", "Failed to unfollow")
+]
+
+class FollowEvent:
+    """Outcome of one follow or unfollow request"""
+
+    __slots__ = ('operation', 'user', 'success', 'timestamp', 'account')
+
+    def __init__(self, operation, user, success, timestamp=None, account=None):
+        self.operation = operation
+        self.user = user
+        self.success = success
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # Managed account that made the request, None for the configured one
+        self.account = account
+
+    @property
+    def category(self):
+        """Report category key of the event"""
+        if self.operation == "follow":
+            return "followed" if self.success else "failed_follows"
+        return "unfollowed" if self.success else "failed_unfollows"
+
+    @property
+    def message(self):
+        """Human readable description, e.g. 'Followed alice.'"""
+        if self.success:
+            verb = "Followed" if self.operation == "follow" else "Unfollowed"
+            return f"{verb} {self.user}."
+        return f"Failed to {self.operation} {self.user}."
+
+    def to_dict(self):
+        """Plain dict representation used for serialization"""
+        data = {'operation': self.operation, 'user': self.user, 'success': self.success, 'timestamp': self.timestamp}
+        if self.account is not None:
+            data['account'] = self.account
+        return data
+
+class EventBus:
+    """
+    In-process publish/subscribe bus for follow events
+
+    A sink is any object with a handle(event) method, and optionally a
+    close() method called when the bus is closed.
+    """
+
+    def __init__(self):
+        self._sinks = []
+
+    def subscribe(self, sink):
+        """Register a sink, returning it for convenience"""
+        self._sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        """Remove a previously registered sink"""
+        self._sinks.remove(sink)
+
+    def publish(self, event):
+        """Hand an event to every sink"""
+        for sink in self._sinks:
+            sink.handle(event)
+
+    def close(self):
+        """Close every sink that supports it"""
+        for sink in self._sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+class ConsoleSink:
+    """Print every event to the console"""
+
+    def handle(self, event):
+        print(f"Tracked: {event.message}")
+
+class ReportAggregator:
+    """
+    Aggregate events into the follow/unfollow report
+
+    Counts are exact, but only the first max_users logins of each category
+    are kept, so memory stays bounded however many users a run touches.
+    Only events of its own account are aggregated, so several accounts
+    can report through one bus.
+    """
+
+    def __init__(self, max_users=REPORT_MAX_USERS, account=None):
+        self.max_users = max_users
+        self.account = account
+        self.clear()
+
+    def handle(self, event):
+        if event.account != self.account:
+            return
+        category = event.category
+        self.counts[category] += 1
+        if len(self.users[category]) < self.max_users:
+            self.users[category].append(event.user)
+
+    def has_changes(self):
+        """True if any event was aggregated since the last clear"""
+        return any(self.counts.values())
+
+    def create_report(self):
+        """Create the JSON report of followed/unfollowed users"""
+        report = {}
+        for key, _ in REPORT_CATEGORIES:
+            report[key] = {"count": self.counts[key], "users": list(self.users[key])}
+            if self.counts[key] > len(self.users[key]):
+                report[key]["omitted"] = self.counts[key] - len(self.users[key])
+        return report
+
+    def create_summary(self):
+        """Create a summary text of changes"""
+        return ", ".join(f"{label}: {self.counts[key]}" for key, label in REPORT_CATEGORIES if self.counts[key])
+
+    def clear(self):
+        """Reset all counts and user lists"""
+        self.counts = {key: 0 for key, _ in REPORT_CATEGORIES}
+        self.users = {key: [] for key, _ in REPORT_CATEGORIES}
+
+class JsonlSink:
+    """Stream every event as one JSON line to a file"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', buffering=1)
+
+    def handle(self, event):
+        self._file.write(json.dumps(event.to_dict()) + '\n')
+
+    def close(self):
+        self._file.close()
@@ -1,46 +1,90 @@
 import os
-import requests
 import time
-from notifications import send_message_to_user, send_discord_notification, no_one_to_follow, no_one_to_unfollow, send_follow_report
+import threading
+from functools import lru_cache
+import requests
+from async_engine import MUTATION_CONCURRENCY, run_user_operations
+from github_api import GitHubClient
+from http_cache import CACHE_DIR, ETagCache
+from incremental_sync import INCREMENTAL_SYNC, IncrementalSync
+from journal import RUN_TIME_BUDGET, RunJournal
+from metrics import metrics
+from rate_limit import RateLimitScheduler
+from snapshot import FollowSnapshot
+from streaming_diff import STREAMING_DIFF, StreamingDiff
+from notifications import flush_notifications, send_message_to_user, publish_result, restore_result, no_one_to_follow, no_one_to_unfollow, send_follow_report
 
 # Get environment variables
 GITHUB_TOKEN = os.getenv('TOKEN')
 GITHUB_USERNAME = os.getenv('USERNAME')
 
-headers = {'Authorization': f'token {GITHUB_TOKEN}'}
+class Account:
+    """
+    API state of one managed account
+    
+    Every account has its own pooled client, page cache and rate-limit
+    scheduler, so the quota of each token is tracked separately.
+    """
+    
+    def __init__(self, username, token, page_cache=None):
+        self.username = username
+        # Conditional-request cache shared by all paginated list fetches
+        self.page_cache = page_cache or ETagCache(os.path.join(CACHE_DIR, f'http_cache_{username}.json'))
+        # Paces follow/unfollow requests according to the rate-limit headers
+        self.scheduler = RateLimitScheduler()
+        # Pooled GitHub API client used for every request
+        self.client = GitHubClient(token, cache=self.page_cache, scheduler=self.scheduler, account=username)
+        # Pages only through list changes since the previous run when INCREMENTAL_SYNC is set
+        self.delta_sync = IncrementalSync(self.client, username)
+
+# Operations run by main() in this order
+OPERATIONS = ("follow", "unfollow")
+
+# Serialises the first call of get_default_account(), lru_cache alone lets threads
+# racing to it each build an Account whose page caches then overwrite each other
+_default_account_lock = threading.Lock()
 
-def get_github_user_list(endpoint, per_page=100):
+@lru_cache(maxsize=None)
+def _create_default_account():
+    return Account(GITHUB_USERNAME, GITHUB_TOKEN, page_cache=ETagCache())
+
+def get_default_account():
+    """
+    The account configured by TOKEN and USERNAME
+    
+    Created on first use, so importing this module neither reads the page
+    cache from disk nor opens connections. Safe to call from several
+    threads, the account is created once.
+    """
+    with _default_account_lock:
+        return _create_default_account()
+
+def get_github_user_list(endpoint, per_page=100, account=None):
     """
     Generic function to fetch user lists from GitHub API with pagination
     
     Args:
         endpoint (str): API endpoint ('following' or 'followers')
         per_page (int): Number of results per page
+        account (Account): Account whose list is fetched, the configured one if not given
         
     Returns:
         list: List of GitHub usernames
     """
-    users = []
-    page = 1
-    while True:
-        url = f'https://api.github.com/users/{GITHUB_USERNAME}/{endpoint}?per_page={per_page}&page={page}'
-        response = requests.get(url, headers=headers)
-        data = response.json()
-        if not data:
-            break
-        users.extend([user['login'] for user in data])
-        page += 1
-    return users
-
-def get_following():
+    account = account or get_default_account()
+    if INCREMENTAL_SYNC:
+        return account.delta_sync.fetch(endpoint, per_page)
+    return account.client.fetch_user_list(account.username, endpoint, per_page)
+
+def get_following(account=None):
     """Fetch list of users the authenticated user is following"""
-    return get_github_user_list('following')
+    return get_github_user_list('following', account=account)
 
-def get_followers():
+def get_followers(account=None):
     """Fetch list of users following the authenticated user"""
-    return get_github_user_list('followers', per_page=110)
+    return get_github_user_list('followers', per_page=110, account=account)
 
-def modify_follow_status(user, action="follow", retries=3):
+def modify_follow_status(user, action="follow", retries=3, account=None):
     """
     Generic function to follow or unfollow a user
     
@@ -48,114 +92,295 @@ def modify_follow_status(user, action="follow", retries=3):
         user (str): GitHub username to follow/unfollow
         action (str): 'follow' or 'unfollow'
         retries (int): Number of retries in case of failure
+        account (Account): Account making the request, the configured one if not given
         
     Returns:
         bool: True if successful, False otherwise
     """
-    url = f'https://api.github.com/user/following/{user}'
-    method = requests.put if action == "follow" else requests.delete
+    account = account or get_default_account()
+    scheduler = account.scheduler
+    path = f'/user/following/{user}'
+    method = account.client.put if action == "follow" else account.client.delete
     
     for i in range(retries):
-        response = method(url, headers=headers)
+        scheduler.acquire()
+        try:
+            response = method(path)
+        except requests.RequestException as e:
+            # Same short exponential backoff as a server error, never retried straight away
+            delay = scheduler.pause(2 ** i)
+            print(f'Request error: {e}. Pausing {delay:.0f}s before retry {i+1}/{retries}...')
+            continue
         if response.status_code == 204:
+            scheduler.record_success()
             return True
-        elif response.status_code == 403:
-            print(f'Rate limit hit. Waiting before retry {i+1}/{retries}...')
-            time.sleep(60)
-        else:
-            print(f'Request failed. Attempt {i+1}/{retries}. Waiting before retry...')
-            time.sleep(2)
+
+        kind, delay = scheduler.backoff(response, i)
+        if kind is None:
+            print(f'Request failed with status {response.status_code}. Not retrying.')
+            return False
+        print(f'Request failed ({kind}). Pausing {delay:.0f}s before retry {i+1}/{retries}...')
     return False
 
-def follow_user(user, retries=3):
+def follow_user(user, retries=3, account=None):
     """Follow a GitHub user"""
-    return modify_follow_status(user, "follow", retries)
+    return modify_follow_status(user, "follow", retries, account)
 
-def unfollow_user(user, retries=3):
+def unfollow_user(user, retries=3, account=None):
     """Unfollow a GitHub user"""
-    return modify_follow_status(user, "unfollow", retries)
+    return modify_follow_status(user, "unfollow", retries, account)
+
+def _out_of_time(deadline):
+    """True once the run time budget is used up"""
+    return deadline is not None and time.monotonic() >= deadline
+
+def _until_deadline(users, deadline):
+    """Yield users until the run time budget is used up"""
+    for user in users:
+        if _out_of_time(deadline):
+            return
+        yield user
+
+def record_result(i, user, operation_type, success, snapshot=None, journal=None, account=None):
+    """
+    Log, journal and publish the outcome of one follow/unfollow request
+    
+    Args:
+        i (int): Position of the user in the list being processed
+        user (str): GitHub username
+        operation_type (str): "follow" or "unfollow"
+        success (bool): Whether the request succeeded
+        snapshot (FollowSnapshot): Optional snapshot updated after a successful mutation
+        journal (RunJournal): Optional journal recording the outcome
+        account (Account): Account that made the request, events are tagged with
+            its username; None for the configured account
+    """
+    username = account.username if account is not None else GITHUB_USERNAME
+    verb = "followed" if operation_type == "follow" else "unfollowed"
+    if journal is not None:
+        journal.record(operation_type, user, success)
+    if success:
+        print(f'{i}. {verb} {user}.')
+        if snapshot is not None:
+            snapshot.record(operation_type, user)
+        
+        # Different messages for follow vs unfollow
+        if operation_type == "follow":
+            message_subject = f"Dear {user}, Thank you for following!"
+            message_body = f"It's great to have you on board. {username} (GitHub)"
+        else:
+            message_subject = f"Dear {user}, It's sad to see you go"
+            message_body = f"We hope to see you again! {username} (GitHub)"
+            
+        send_message_to_user(user, message_subject, message_body)
+    else:
+        print(f'{i}. Failed to {operation_type} {user}.')
+    publish_result(operation_type, user, success, account=account.username if account is not None else None)
 
-def process_user_list(users, operation_type):
+def process_user_list(users, operation_type, concurrency=MUTATION_CONCURRENCY, snapshot=None,
+                      journal=None, deadline=None):
     """
     Process a list of users to follow or unfollow them
     
     Args:
         users (list): List of usernames to process
         operation_type (str): "follow" or "unfollow"
+        concurrency (int): Number of requests in flight, 1 processes users one at a time
+        snapshot (FollowSnapshot): Optional snapshot updated after each successful mutation
+        journal (RunJournal): Optional journal recording each outcome
+        deadline (float): time.monotonic() value after which no new user is started
     """
     operation_func = follow_user if operation_type == "follow" else unfollow_user
-    verb = "followed" if operation_type == "follow" else "unfollowed"
-    failed_verb = f"Failed to {operation_type}"
+    users = _until_deadline(users, deadline)
     
-    for i, user in enumerate(users, 1):
-        if operation_func(user):
-            print(f'{i}. {verb} {user}.')
-            
-            # Different messages for follow vs unfollow
-            if operation_type == "follow":
-                message_subject = f"Dear {user}, Thank you for following!"
-                message_body = f"It's great to have you on board. {GITHUB_USERNAME} (GitHub)"
-            else:
-                message_subject = f"Dear {user}, It's sad to see you go"
-                message_body = f"We hope to see you again! {GITHUB_USERNAME} (GitHub)"
-                
-            send_message_to_user(user, message_subject, message_body)
-            send_discord_notification(f"{verb.capitalize()} {user}.")
-        else:
-            print(f'{i}. {failed_verb} {user}.')
-            send_discord_notification(f"{failed_verb} {user}.")
-        time.sleep(2)
+    def handle_result(i, user, success):
+        record_result(i, user, operation_type, success, snapshot, journal)
+    
+    with metrics.stage('mutate'):
+        if concurrency > 1:
+            run_user_operations(users, operation_func, handle_result, concurrency)
+            return
+        
+        # Synchronous fallback
+        for i, user in enumerate(users, 1):
+            handle_result(i, user, operation_func(user))
 
-def process_follow_unfollow(operation_type):
+def process_follow_unfollow(operation_type, snapshot=None, journal=None, deadline=None):
     """
     Common function to handle follow/unfollow operations
     
     Args:
         operation_type (str): "follow" or "unfollow"
+        snapshot (FollowSnapshot): Snapshot shared between operations, fetched if not given
+        journal (RunJournal): Optional journal; a plan already in it is resumed without fetching
+        deadline (float): time.monotonic() value after which no new user is started
     """
-    following = set(get_following())
-    followers = set(get_followers())
+    if journal is not None and operation_type in journal.plans:
+        if operation_type in journal.reported:
+            return
+        # Rebuild the report from the journal and skip users that were already processed
+        for _, user, success in journal.results(operation_type):
+            restore_result(operation_type, user, success)
+        planned_users = journal.plans[operation_type]
+        target_users = journal.remaining(operation_type)
+    else:
+        if snapshot is None:
+            with metrics.stage('fetch'):
+                snapshot = FollowSnapshot.fetch(get_followers, get_following)
+        with metrics.stage('diff'):
+            to_follow, to_unfollow = snapshot.diff()
+        planned_users = target_users = to_follow if operation_type == "follow" else to_unfollow
+        if journal is not None:
+            journal.plan(operation_type, target_users)
     
     if operation_type == "follow":
-        target_users = list(followers - following)  # Users to follow
         empty_message = 'No one left to follow back'
         notify_func = no_one_to_follow
         success_message = f'\n {len(target_users)} are left to followback \n'
         user_list_title = '\nList of users to follow:\n'
         finish_message = '\nFinished processing all non-following.'
     else:  # unfollow
-        target_users = list(following - followers)  # Users to unfollow
         empty_message = 'You don\'t follow anyone who doesn\'t follow you back.'
         notify_func = no_one_to_unfollow
         success_message = f'\nYou follow {len(target_users)} people who don\'t follow you back.'
         user_list_title = '\nList of non-followers:\n'
         finish_message = '\nFinished processing all non-followers.'
         
-    if not target_users:
+    if not planned_users:
         print(empty_message)
         notify_func()
+        if journal is not None:
+            journal.mark_reported(operation_type)
         return
         
-    print(success_message)
-    print(user_list_title)
+    if not _out_of_time(deadline):
+        print(success_message)
+        print(user_list_title)
+        
+        # Process the list of users
+        process_user_list(target_users, operation_type, snapshot=snapshot, journal=journal, deadline=deadline)
     
-    # Process the list of users
-    process_user_list(target_users, operation_type)
+    if journal is not None and journal.remaining(operation_type):
+        print('\nRun time budget used up, the remaining users are left for the next run.')
+        return
     
     print(finish_message)
     # Send combined report after processing is complete
     send_follow_report()
+    if journal is not None:
+        journal.mark_reported(operation_type)
 
-def follow_all_followers():
+def follow_all_followers(snapshot=None, journal=None, deadline=None):
     """Follow all users who follow you but you don't follow back"""
-    process_follow_unfollow("follow")
-
-# Execute the follow operation
-follow_all_followers()
+    process_follow_unfollow("follow", snapshot, journal, deadline)
 
-def find_and_unfollow_non_followers():
+def find_and_unfollow_non_followers(snapshot=None, journal=None, deadline=None):
     """Unfollow users who don't follow you back"""
-    process_follow_unfollow("unfollow")
+    process_follow_unfollow("unfollow", snapshot, journal, deadline)
+
+def run_streaming_diff(deadline=None, operations=OPERATIONS):
+    """
+    Run both operations from a streaming diff, for lists too large to hold in memory
+    
+    Follow mutations start while the followers are still being fetched, and
+    unfollow candidates are merge-joined from the sorted lists on disk. No
+    journal is kept since the users are not known up front; an interrupted
+    run simply computes the diff again. The pages are fetched without the
+    page cache, which would otherwise hold every login in memory and, for
+    lists this long, evict its entries before they could be reused.
+    
+    Args:
+        deadline (float): time.monotonic() value after which no new user is started
+        operations (tuple): Operations to run, out of "follow" and "unfollow"
+    """
+    # Same token and rate-limit scheduler as the mutations, but no page cache
+    client = GitHubClient(GITHUB_TOKEN, scheduler=get_default_account().scheduler, account=GITHUB_USERNAME)
+    per_page = {'followers': 110, 'following': 100}
+    diff = StreamingDiff(lambda endpoint: client.iter_pages(GITHUB_USERNAME, endpoint, per_page[endpoint]))
+    try:
+        with metrics.stage('fetch'):
+            diff.start()
+        for operation_type, candidates, notify_func in (("follow", diff.follow_candidates, no_one_to_follow),
+                                                        ("unfollow", diff.unfollow_candidates, no_one_to_unfollow)):
+            if operation_type not in operations:
+                continue
+            seen = 0
+            def counted(users):
+                nonlocal seen
+                for user in users:
+                    seen += 1
+                    yield user
+            
+            print(f'\nStreaming users to {operation_type}:\n')
+            process_user_list(counted(candidates()), operation_type, deadline=deadline)
+            if not seen and not _out_of_time(deadline):
+                print(f'No one to {operation_type}.')
+                notify_func()
+            elif seen:
+                send_follow_report()
+    finally:
+        client.close()
+        diff.close()
+
+def run_journaled(deadline=None, operations=OPERATIONS):
+    """
+    Run the operations from a fresh snapshot, or resume them from the journal of an interrupted run
+    
+    Args:
+        deadline (float): time.monotonic() value after which no new user is started
+        operations (tuple): Operations to run, out of "follow" and "unfollow"
+    """
+    # Resume an interrupted run from its journal, or plan a new one from a fresh snapshot
+    journal = RunJournal(GITHUB_USERNAME)
+    snapshot = None
+    if journal.resumable:
+        print('Resuming an interrupted run from its journal.')
+    else:
+        # Fetch followers and following once, both operations work from this snapshot
+        with metrics.stage('fetch'):
+            snapshot = FollowSnapshot.fetch(get_followers, get_following)
+        with metrics.stage('diff'):
+            to_follow, to_unfollow = snapshot.diff()
+        for operation_type, users in (("follow", to_follow), ("unfollow", to_unfollow)):
+            if operation_type in operations:
+                journal.plan(operation_type, users)
+    
+    # Execute the follow operation
+    if "follow" in operations:
+        follow_all_followers(snapshot, journal, deadline)
+    
+    # Execute the unfollow operation
+    if "unfollow" in operations:
+        find_and_unfollow_non_followers(snapshot, journal, deadline)
+    
+    if journal.finished:
+        # Keep the stored following list in step with this run's mutations
+        if INCREMENTAL_SYNC:
+            results = journal.results()
+            get_default_account().delta_sync.record_mutations(
+                [user for operation, user, success in results if operation == "follow" and success],
+                [user for operation, user, success in results if operation == "unfollow" and success])
+        journal.complete()
+    else:
+        journal.close()
+
+def main(operations=OPERATIONS):
+    """
+    Run the follow and unfollow operations for the configured account
+    
+    Args:
+        operations (tuple): Operations to run, out of "follow" and "unfollow"; the
+            plan of an operation left out stays in the journal for a later run
+    """
+    deadline = time.monotonic() + RUN_TIME_BUDGET if RUN_TIME_BUDGET else None
+    try:
+        if STREAMING_DIFF:
+            run_streaming_diff(deadline, operations)
+        else:
+            run_journaled(deadline, operations)
+    finally:
+        flush_notifications()
+        metrics.export('follow_unfollow')
 
-# Execute the unfollow operation
-find_and_unfollow_non_followers()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+from metrics import metrics
+
+# Base URL of the REST API, overridable to point at a local stand-in server
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+
+# Number of pages fetched concurrently once the last page is known
+PAGE_FETCH_WORKERS = int(os.getenv('PAGE_FETCH_WORKERS', '8'))
+# Maximum number of keep-alive connections kept open per host
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+# Seconds to wait for a server response before giving up on a request
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+
+class GitHubAPIError(requests.HTTPError):
+    """Raised when a list page is answered with an error status instead of a list"""
+
+def create_session(pool_size=HTTP_POOL_SIZE):
+    """
+    Create a requests session with a keep-alive connection pool
+
+    Args:
+        pool_size (int): Maximum number of connections kept open per host
+
+    Returns:
+        requests.Session: Session reusing connections across requests
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+def get_last_page(response):
+    """
+    Read the last page number from the Link header of a paginated response
+
+    Args:
+        response (requests.Response): Response for the first page
+
+    Returns:
+        int: Last page number, or None if the header has no rel="last" link
+    """
+    last = response.links.get('last')
+    if not last:
+        return None
+    page = parse_qs(urlparse(last['url']).query).get('page')
+    return int(page[0]) if page else None
+
+class GitHubClient:
+    """
+    GitHub REST client shared by the follow/unfollow and visualization scripts
+
+    All requests go through one pooled session, so connections and TLS
+    sessions are reused. Every response is reported to the rate-limit
+    scheduler, and paginated list pages are revalidated against the ETag
+    cache when one is given.
+    """
+
+    def __init__(self, token=None, api_url=GITHUB_API_URL, pool_size=HTTP_POOL_SIZE,
+                 timeout=HTTP_TIMEOUT, cache=None, scheduler=None, account=None):
+        self.api_url = api_url
+        # Managed account the token belongs to, its requests are also counted per account
+        self.account = account
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.session = create_session(pool_size)
+        self.session.headers['Accept'] = 'application/vnd.github+json'
+        if token:
+            self.session.headers['Authorization'] = f'token {token}'
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request to the GitHub API
+
+        Args:
+            method (str): HTTP method
+            path (str): API path such as '/users/octocat', or a full URL
+            **kwargs: Extra arguments passed to requests
+
+        Returns:
+            requests.Response: The API response
+        """
+        url = path if path.startswith('http') else f'{self.api_url}{path}'
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.observe_request(method, url, 'error', time.perf_counter() - start, account=self.account)
+            raise
+        metrics.observe_request(method, url, response.status_code, time.perf_counter() - start,
+                                response.headers.get('X-RateLimit-Remaining'), self.account)
+        if self.scheduler is not None:
+            self.scheduler.observe(response)
+        return response
+
+    def get(self, path, **kwargs):
+        """Send a GET request"""
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        """Send a POST request"""
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        """Send a PUT request"""
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        """Send a DELETE request"""
+        return self.request('DELETE', path, **kwargs)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+    def _page_path(self, username, endpoint, per_page, page):
+        """Build the path of a single page of a user list"""
+        return f'/users/{username}/{endpoint}?per_page={per_page}&page={page}'
+
+    def get_page(self, path):
+        """
+        Fetch one page of a user list, revalidating it against the cache if set
+
+        Args:
+            path (str): Page path or URL
+
+        Returns:
+            tuple: (list of logins on the page, last page number or None)
+
+        Raises:
+            GitHubAPIError: If the response is neither 200 nor a 304 for a cached page,
+                e.g. a rate limit or an invalid token
+        """
+        entry = self.cache.get(path) if self.cache is not None else None
+        headers = {'If-None-Match': entry['etag']} if entry else None
+
+        response = self.get(path, headers=headers)
+        if entry and response.status_code == 304:
+            # Not modified: reuse the cached body, this does not count against the rate limit
+            self.cache.record_hit()
+            return entry['logins'], entry['last_page']
+        if response.status_code != 200:
+            raise GitHubAPIError(f"{response.status_code} error fetching {path}: "
+                                 f"{response.text[:200]}", response=response)
+
+        logins = [user['login'] for user in response.json()]
+        last_page = get_last_page(response)
+        if self.cache is not None:
+            self.cache.record_miss()
+            etag = response.headers.get('ETag')
+            if etag:
+                self.cache.put(path, etag, logins, last_page)
+        return logins, last_page
+
+    def fetch_page(self, username, endpoint, per_page, page):
+        """Fetch one page of a user list and return the logins it contains"""
+        logins, _ = self.get_page(self._page_path(username, endpoint, per_page, page))
+        return logins
+
+    def iter_pages(self, username, endpoint, per_page=100, max_workers=PAGE_FETCH_WORKERS):
+        """
+        Yield the pages of a user list in page order
+        
+        The first page is requested on its own to learn the page count from the
+        Link header. The remaining pages are then fetched concurrently, with at
+        most twice max_workers pages requested ahead of the consumer, so memory
+        stays bounded however long the list is. Without a rel="last" link the
+        pages are walked sequentially until an empty page comes back.
+        
+        Args:
+            username (str): GitHub username whose list is fetched
+            endpoint (str): API endpoint ('following' or 'followers')
+            per_page (int): Number of results per page
+            max_workers (int): Maximum number of pages fetched at the same time
+            
+        Yields:
+            list: Logins on each page
+        """
+        logins, last_page = self.get_page(self._page_path(username, endpoint, per_page, 1))
+        if not logins:
+            return
+        yield logins
+        
+        if last_page is None:
+            page = 2
+            while True:
+                logins = self.fetch_page(username, endpoint, per_page, page)
+                if not logins:
+                    return
+                yield logins
+                page += 1
+        
+        pages = iter(range(2, last_page + 1))
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, last_page - 1))) as executor:
+            submit = lambda page: executor.submit(self.fetch_page, username, endpoint, per_page, page)
+            pending = deque(submit(page) for page in islice(pages, 2 * max_workers))
+            while pending:
+                logins = pending.popleft().result()
+                for page in islice(pages, 1):
+                    pending.append(submit(page))
+                yield logins
+
+    def fetch_user_list(self, username, endpoint, per_page=100, max_workers=PAGE_FETCH_WORKERS):
+        """
+        Fetch a complete user list from GitHub API
+        
+        Pages are fetched concurrently by iter_pages() and merged back in page
+        order. When a cache is set every page is requested conditionally and
+        unchanged pages are served from it.
+        
+        Args:
+            username (str): GitHub username whose list is fetched
+            endpoint (str): API endpoint ('following' or 'followers')
+            per_page (int): Number of results per page
+            max_workers (int): Maximum number of pages fetched at the same time
+            
+        Returns:
+            list: List of GitHub usernames
+        """
+        users = []
+        for logins in self.iter_pages(username, endpoint, per_page, max_workers):
+            users.extend(logins)
+        self.save_cache()
+        return users
+
+    def save_cache(self):
+        """Persist the page cache, if any, and report its hit rate"""
+        if self.cache is not None:
+            self.cache.save()
+            stats = self.cache.stats()
+            print(f"Page cache: {stats['hits']} hits, {stats['misses']} misses")
+
+    def get_user(self, username):
+        """
+        Fetch the profile of a GitHub user
+
+        Returns:
+            dict: Profile JSON, or None if the request failed
+        """
+        response = self.get(f'/users/{username}')
+        if response.status_code != 200:
+            return None
+        return response.json()
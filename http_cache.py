@@ -0,0 +1,98 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# Directory holding on-disk caches between runs
+CACHE_DIR = os.getenv('CACHE_DIR', '.cache')
+
+# Maximum number of page entries kept before the least recently used are evicted
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv('HTTP_CACHE_MAX_ENTRIES', '5000'))
+
+class ETagCache:
+    """
+    On-disk cache of ETags and parsed logins keyed by page URL
+
+    Entries are kept in least recently used order so that the oldest pages
+    are evicted first once the cache grows past max_entries. The file is
+    read on first use, so a process that never fetches a list page (e.g.
+    one that only follows and unfollows) does not hold it in memory.
+    """
+
+    def __init__(self, path=None, max_entries=HTTP_CACHE_MAX_ENTRIES):
+        self.path = path or os.path.join(CACHE_DIR, 'http_cache.json')
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # None until the file is loaded
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Load cached entries from disk if not done yet, called with the lock held"""
+        if self._entries is not None:
+            return
+        try:
+            with open(self.path) as f:
+                self._entries = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            self._entries = OrderedDict()
+
+    def get(self, url):
+        """
+        Look up the cached entry for a URL
+
+        Args:
+            url (str): Page URL
+
+        Returns:
+            dict: Entry with 'etag', 'logins' and 'last_page', or None if not cached
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url, etag, logins, last_page=None):
+        """Store the ETag and parsed logins of a page, evicting old entries if needed"""
+        with self._lock:
+            self._load()
+            self._entries[url] = {'etag': etag, 'logins': logins, 'last_page': last_page}
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_hit(self):
+        """Count a request answered with 304 Not Modified"""
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        """Count a request that had to download the page body"""
+        with self._lock:
+            self.misses += 1
+
+    def stats(self):
+        """Return hit/miss counters for the current run"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries or ()),
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    def save(self):
+        """Write the cache to disk atomically, nothing to do if it was never used"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        # Held while writing so concurrent list fetches do not share the temp file
+        with self._lock:
+            if self._entries is None:
+                return
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self._entries.items()), f)
+            os.replace(tmp_path, self.path)
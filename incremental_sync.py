@@ -0,0 +1,143 @@
+import os
+import json
+import time
+from http_cache import CACHE_DIR
+
+# Enable incremental list fetching instead of walking every page
+INCREMENTAL_SYNC = os.getenv('INCREMENTAL_SYNC', '').lower() in ('1', 'true', 'yes')
+# Days between full reconciliations that catch removals deep in the list
+FULL_SYNC_INTERVAL_DAYS = float(os.getenv('FULL_SYNC_INTERVAL_DAYS', '7'))
+# Number of consecutive logins that must match the stored list to stop paging
+STABLE_RUN_LENGTH = int(os.getenv('STABLE_RUN_LENGTH', '20'))
+
+class IncrementalSync:
+    """
+    Fetch follower/following lists by paging only through what changed
+
+    GitHub returns these lists newest first, so after the first full fetch
+    a run only needs the pages up to the point where the stored list
+    continues unchanged. The merged list is checked against the counts on
+    the user's profile, and a full fetch is done whenever they disagree or
+    the last full fetch is older than the reconciliation interval.
+    """
+
+    def __init__(self, client, username, state_dir=CACHE_DIR,
+                 full_sync_interval_days=FULL_SYNC_INTERVAL_DAYS, stable_run_length=STABLE_RUN_LENGTH):
+        self.client = client
+        self.username = username
+        self.state_dir = state_dir
+        self.full_sync_interval = full_sync_interval_days * 86400
+        self.stable_run_length = stable_run_length
+
+    def _state_path(self, endpoint):
+        """Path of the stored list for an endpoint"""
+        return os.path.join(self.state_dir, f'sync_{self.username}_{endpoint}.json')
+
+    def _load(self, endpoint):
+        """Load the stored list for an endpoint, or None if there is none"""
+        try:
+            with open(self._state_path(endpoint)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, endpoint, users, full_sync_at):
+        """Store the list for an endpoint atomically"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(endpoint)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'users': users, 'full_sync_at': full_sync_at}, f)
+        os.replace(f'{path}.tmp', path)
+
+    def _expected_count(self, endpoint):
+        """Read the follower or following count from the user's profile"""
+        profile = self.client.get_user(self.username)
+        return profile.get(endpoint) if profile else None
+
+    def _fetch_changed_prefix(self, endpoint, per_page, known):
+        """
+        Page through a list until it joins the stored list
+
+        Args:
+            endpoint (str): API endpoint ('following' or 'followers')
+            per_page (int): Number of results per page
+            known (list): List stored by the previous run, newest first
+
+        Returns:
+            tuple: (merged list, number of pages fetched)
+        """
+        known_index = {login: i for i, login in enumerate(known)}
+        fetched = []
+        page = 0
+        exhausted = False
+
+        def fetch_next_page():
+            nonlocal page, exhausted
+            page += 1
+            logins = self.client.fetch_page(self.username, endpoint, per_page, page)
+            if not logins:
+                exhausted = True
+            fetched.extend(logins)
+
+        j = 0
+        while True:
+            if j >= len(fetched):
+                if exhausted:
+                    # Walked the whole list without joining, so it is complete
+                    return fetched, page
+                fetch_next_page()
+                continue
+
+            i = known_index.get(fetched[j])
+            if i is not None:
+                need = min(self.stable_run_length, len(known) - i)
+                while len(fetched) < j + need and not exhausted:
+                    fetch_next_page()
+                if fetched[j:j + need] == known[i:i + need]:
+                    seen = set(fetched[:j])
+                    return fetched[:j] + [user for user in known[i:] if user not in seen], page
+            j += 1
+
+    def fetch(self, endpoint, per_page=100):
+        """
+        Fetch a user list, incrementally when a recent stored list exists
+
+        Args:
+            endpoint (str): API endpoint ('following' or 'followers')
+            per_page (int): Number of results per page
+
+        Returns:
+            list: List of GitHub usernames, newest first
+        """
+        state = self._load(endpoint)
+        now = time.time()
+        if state is not None and now - state['full_sync_at'] < self.full_sync_interval:
+            users, pages = self._fetch_changed_prefix(endpoint, per_page, state['users'])
+            if len(users) == self._expected_count(endpoint):
+                print(f"Incremental sync of {endpoint}: {pages} pages, {len(users)} users")
+                self._save(endpoint, users, state['full_sync_at'])
+                return users
+            print(f"Incremental sync of {endpoint} does not match the profile count, doing a full sync")
+
+        users = self.client.fetch_user_list(self.username, endpoint, per_page)
+        print(f"Full sync of {endpoint}: {len(users)} users")
+        self._save(endpoint, users, now)
+        return users
+
+    def record_mutations(self, followed, unfollowed):
+        """
+        Apply this run's follows and unfollows to the stored following list
+
+        Newly followed users are moved to the front, matching GitHub's
+        newest-first order, so the next run joins the stored list right away.
+
+        Args:
+            followed (list): Users followed in this run, in order
+            unfollowed (list): Users unfollowed in this run
+        """
+        state = self._load('following')
+        if state is None or not (followed or unfollowed):
+            return
+        changed = set(followed) | set(unfollowed)
+        users = list(reversed(followed)) + [user for user in state['users'] if user not in changed]
+        self._save('following', users, state['full_sync_at'])
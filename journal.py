@@ -0,0 +1,152 @@
+import os
+import json
+import time
+from http_cache import CACHE_DIR
+
+# Number of completed mutations written between fsync calls
+JOURNAL_FSYNC_EVERY = int(os.getenv('JOURNAL_FSYNC_EVERY', '20'))
+# Hours after which an unfinished journal is considered too old to resume,
+# well above the daily schedule so the next scheduled run still picks it up
+JOURNAL_MAX_AGE_HOURS = float(os.getenv('JOURNAL_MAX_AGE_HOURS', '72'))
+# Seconds a run may spend on mutations before leaving the rest to the next run (0 = no limit)
+RUN_TIME_BUDGET = float(os.getenv('RUN_TIME_BUDGET', '0'))
+
+class RunJournal:
+    """
+    Append-only journal of planned and completed follow/unfollow mutations
+
+    Each line is one JSON record: a 'plan' with the target users of an
+    operation, a 'done' per processed user, a 'reported' once the report for
+    an operation was sent, and 'complete' at the end of the run. A run that
+    is killed leaves the journal behind, and the next run resumes from it
+    instead of fetching the lists and repeating finished mutations.
+    Completed mutations are fsynced in batches, plans and markers at once.
+    """
+
+    def __init__(self, username, path=None, fsync_every=JOURNAL_FSYNC_EVERY,
+                 max_age_hours=JOURNAL_MAX_AGE_HOURS):
+        self.path = path or os.path.join(CACHE_DIR, f'journal_{username}.jsonl')
+        self.fsync_every = fsync_every
+        self.plans = {}
+        self.done = {}
+        self.reported = set()
+        self.started_at = None
+        self._unsynced = 0
+
+        self._replay()
+        if self.plans and self.started_at < time.time() - max_age_hours * 3600:
+            print("Discarding journal of an interrupted run, it is too old to resume")
+            self._reset()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a')
+
+    def _reset(self):
+        """Forget the replayed state and truncate the journal file"""
+        self.plans = {}
+        self.done = {}
+        self.reported = set()
+        self.started_at = None
+        open(self.path, 'w').close()
+
+    def _replay(self):
+        """Rebuild the state of an unfinished run from the journal file, dropping a torn last record"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+
+        # Byte offset just past the last complete record
+        offset = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            offset += len(line)
+            if record['type'] == 'plan':
+                self.plans[record['operation']] = record['users']
+                self.started_at = self.started_at or record['time']
+            elif record['type'] == 'done':
+                self.done[(record['operation'], record['user'])] = record['ok']
+            elif record['type'] == 'reported':
+                self.reported.add(record['operation'])
+            elif record['type'] == 'complete':
+                self.plans, self.done, self.reported, self.started_at = {}, {}, set(), None
+        if offset != len(data):
+            # A line cut short by a killed run, everything before it is valid. Cut it
+            # off so the records appended by this run do not continue the fragment
+            os.truncate(self.path, offset)
+
+    @property
+    def resumable(self):
+        """True if the journal holds an unfinished run"""
+        return bool(self.plans)
+
+    @property
+    def finished(self):
+        """True once the report of every planned operation was sent"""
+        return set(self.plans) <= self.reported
+
+    def _append(self, record, sync):
+        """Write one record, fsyncing now or once enough records are buffered"""
+        self._file.write(json.dumps(record) + '\n')
+        self._unsynced += 1
+        if sync or self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records to disk"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def plan(self, operation_type, users):
+        """Record the target users of an operation before any of them is processed"""
+        self.plans[operation_type] = list(users)
+        self.started_at = self.started_at or time.time()
+        self._append({'type': 'plan', 'operation': operation_type, 'users': self.plans[operation_type],
+                      'time': time.time()}, sync=True)
+
+    def record(self, operation_type, user, success):
+        """Record the outcome of one mutation"""
+        self.done[(operation_type, user)] = success
+        self._append({'type': 'done', 'operation': operation_type, 'user': user, 'ok': success}, sync=False)
+
+    def mark_reported(self, operation_type):
+        """Record that the report for an operation was sent"""
+        self.reported.add(operation_type)
+        self._append({'type': 'reported', 'operation': operation_type}, sync=True)
+
+    def remaining(self, operation_type):
+        """Planned users of an operation that have not been processed yet"""
+        return [user for user in self.plans.get(operation_type, []) if (operation_type, user) not in self.done]
+
+    def results(self, operation_type=None):
+        """
+        Outcomes recorded so far, in the order they completed
+
+        Args:
+            operation_type (str): Only return outcomes of this operation if given
+
+        Returns:
+            list: (operation_type, user, success) tuples
+        """
+        return [(operation, user, success) for (operation, user), success in self.done.items()
+                if operation_type is None or operation == operation_type]
+
+    def complete(self):
+        """Mark the run as finished and remove the journal"""
+        self._append({'type': 'complete'}, sync=True)
+        self._file.close()
+        os.remove(self.path)
+
+    def close(self):
+        """Sync and close the journal, leaving it in place for the next run"""
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from http_cache import CACHE_DIR
+
+# Directory the JSON run summary of every entry point is written to
+METRICS_DIR = os.getenv('METRICS_DIR', CACHE_DIR)
+# Directory of the node_exporter textfile collector, the Prometheus export is skipped if unset
+METRICS_TEXTFILE_DIR = os.getenv('METRICS_TEXTFILE_DIR')
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Rate-limit samples kept per run, the series is thinned to every other sample when full
+RATE_LIMIT_SAMPLES = 500
+
+# Request paths reduced to endpoint templates, so metrics do not get one series per user
+_ENDPOINTS = [
+    (re.compile(r'/users/[^/]+/(followers|following)$'), r'/users/:user/\1'),
+    (re.compile(r'/users/[^/]+$'), '/users/:user'),
+    (re.compile(r'/user/following/[^/]+$'), '/user/following/:user')
+]
+
+def endpoint_of(method, url):
+    """
+    Endpoint template of a request, e.g. 'GET /users/:user/followers'
+
+    Args:
+        method (str): HTTP method
+        url (str): Request path or URL, query string included
+
+    Returns:
+        str: Method and path with user names replaced
+    """
+    path = urlsplit(url).path
+    for pattern, template in _ENDPOINTS:
+        match = pattern.search(path)
+        if match:
+            path = match.expand(template)
+            break
+    return f'{method} {path}'
+
+class _Histogram:
+    """Latency counts per LATENCY_BUCKETS bucket, plus an overflow bucket"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, None if it is the overflow bucket"""
+        total = sum(self.counts)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if total and seen >= q * total:
+                return bound
+        return None
+
+class Metrics:
+    """
+    In-process record of where a run spends its time and API quota
+
+    The API client reports every request (endpoint, status, latency and
+    the rate-limit remaining header), the rate-limit scheduler every retry
+    and backoff, and the entry points time their stages. Recording is a
+    few dict updates under a lock; nothing is written until export().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = {}
+        self.retries = Counter()
+        self.backoff_seconds = Counter()
+        self.rate_limit = []
+        self.stages = Counter()
+        self.caches = {}
+        # Per managed account: request latency and the last rate-limit remaining of its token
+        self.accounts = {}
+
+    def observe_request(self, method, url, status, seconds, remaining=None, account=None):
+        """
+        Record one API request
+
+        Args:
+            method (str): HTTP method
+            url (str): Request path or URL
+            status (int): Response status, or 'error' if no response arrived
+            seconds (float): Time until the response arrived
+            remaining (str): X-RateLimit-Remaining header of the response, if any
+            account (str): Managed account whose token made the request, if known
+        """
+        endpoint = endpoint_of(method, url)
+        with self._lock:
+            stats = self.requests.get(endpoint)
+            if stats is None:
+                stats = self.requests[endpoint] = {'status': Counter(), 'latency': _Histogram()}
+            stats['status'][str(status)] += 1
+            stats['latency'].observe(seconds)
+            if remaining is not None:
+                self._sample_rate_limit(int(remaining))
+            if account is not None:
+                usage = self.accounts.get(account)
+                if usage is None:
+                    usage = self.accounts[account] = {'latency': _Histogram(), 'remaining': None}
+                usage['latency'].observe(seconds)
+                if remaining is not None:
+                    usage['remaining'] = int(remaining)
+
+    def _sample_rate_limit(self, remaining):
+        """Add a rate-limit sample, at most one per second"""
+        now = round(time.time() - self.started_at, 1)
+        if self.rate_limit and now - self.rate_limit[-1][0] < 1:
+            self.rate_limit[-1] = (self.rate_limit[-1][0], remaining)
+            return
+        self.rate_limit.append((now, remaining))
+        if len(self.rate_limit) > RATE_LIMIT_SAMPLES:
+            # Keep every other sample, ending with the newest one
+            self.rate_limit = self.rate_limit[(len(self.rate_limit) - 1) % 2::2]
+
+    def observe_backoff(self, kind, seconds=0.0):
+        """Record a retried request and the pause before the retry"""
+        with self._lock:
+            self.retries[kind] += 1
+            self.backoff_seconds[kind] += seconds
+
+    def add_stage(self, name, seconds):
+        """Add time spent in a stage, repeated stages add up"""
+        with self._lock:
+            self.stages[name] += seconds
+
+    def record_cache(self, name, stats):
+        """Keep the latest effectiveness statistics of a cache, e.g. ProfileCache.stats()"""
+        with self._lock:
+            self.caches[name] = dict(stats)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as part of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def summary(self):
+        """
+        Summary of the run so far
+
+        Returns:
+            dict: Per-endpoint counts and latency histograms, retries, backoff
+            time, rate-limit samples, stage durations, cache statistics and
+            per-account request counts
+        """
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(time.time() - self.started_at, 3),
+                'requests': {
+                    endpoint: {
+                        'count': sum(stats['status'].values()),
+                        'status': dict(stats['status']),
+                        'latency_seconds': {
+                            'sum': round(stats['latency'].sum, 3),
+                            'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'],
+                                                stats['latency'].counts))
+                        }
+                    } for endpoint, stats in sorted(self.requests.items())
+                },
+                'retries': dict(self.retries),
+                'backoff_seconds': {kind: round(seconds, 3) for kind, seconds in self.backoff_seconds.items()},
+                'rate_limit_remaining': [list(sample) for sample in self.rate_limit],
+                'stage_seconds': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                'caches': {name: dict(stats) for name, stats in self.caches.items()},
+                'accounts': {
+                    account: {
+                        'requests': sum(usage['latency'].counts),
+                        'latency_seconds_sum': round(usage['latency'].sum, 3),
+                        'rate_limit_remaining': usage['remaining']
+                    } for account, usage in sorted(self.accounts.items())
+                }
+            }
+
+    def condensed(self, account=None):
+        """
+        One-line summary for the Discord report
+
+        Args:
+            account (str): Managed account whose own requests and quota are shown;
+                retries and stage timings cover the whole process and are labelled so
+        """
+        with self._lock:
+            if account is not None:
+                usage = self.accounts.get(account, {'latency': _Histogram(), 'remaining': None})
+                latency, remaining = usage['latency'], usage['remaining']
+            else:
+                latency = _Histogram()
+                for stats in self.requests.values():
+                    latency.counts = [a + b for a, b in zip(latency.counts, stats['latency'].counts)]
+                    latency.sum += stats['latency'].sum
+                remaining = self.rate_limit[-1][1] if self.rate_limit else None
+            count = sum(latency.counts)
+            parts = []
+            if count:
+                p95 = latency.quantile(0.95)
+                p95_text = f"≤{p95 * 1000:.0f} ms" if p95 else f">{LATENCY_BUCKETS[-1]:.0f} s"
+                parts.append(f"API {count} req, avg {latency.sum / count * 1000:.0f} ms, p95 {p95_text}")
+            if remaining is not None:
+                parts.append(f"{remaining} quota left")
+            shared = []
+            if self.retries:
+                shared.append(f"{sum(self.retries.values())} retries, {sum(self.backoff_seconds.values()):.0f} s backoff")
+            if self.stages:
+                shared.append(", ".join(f"{stage} {seconds:.1f} s" for stage, seconds in self.stages.items()))
+            if account is not None and shared:
+                # Several accounts share the process, these are not broken down per account
+                shared[0] = f"all accounts: {shared[0]}"
+            return " · ".join(parts + shared)
+
+    def to_prometheus(self, job):
+        """
+        Render the metrics in the Prometheus text exposition format
+
+        Args:
+            job (str): Entry point name, added as the 'job' label
+        """
+        summary = self.summary()
+        lines = [
+            '# HELP fu_api_requests_total GitHub API requests by endpoint and status',
+            '# TYPE fu_api_requests_total counter'
+        ]
+        for endpoint, stats in summary['requests'].items():
+            for status, count in sorted(stats['status'].items()):
+                lines.append(f'fu_api_requests_total{{job="{job}",endpoint="{endpoint}",status="{status}"}} {count}')
+        lines += ['# HELP fu_api_request_duration_seconds GitHub API request latency',
+                  '# TYPE fu_api_request_duration_seconds histogram']
+        for endpoint, stats in summary['requests'].items():
+            cumulative = 0
+            for bound, count in stats['latency_seconds']['buckets'].items():
+                cumulative += count
+                lines.append(f'fu_api_request_duration_seconds_bucket{{job="{job}",endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'fu_api_request_duration_seconds_sum{{job="{job}",endpoint="{endpoint}"}} {stats["latency_seconds"]["sum"]}')
+            lines.append(f'fu_api_request_duration_seconds_count{{job="{job}",endpoint="{endpoint}"}} {stats["count"]}')
+        lines += ['# HELP fu_api_retries_total Retried requests by cause',
+                  '# TYPE fu_api_retries_total counter']
+        lines += [f'fu_api_retries_total{{job="{job}",kind="{kind}"}} {count}' for kind, count in summary['retries'].items()]
+        lines += ['# HELP fu_api_backoff_seconds_total Seconds paused before retries by cause',
+                  '# TYPE fu_api_backoff_seconds_total counter']
+        lines += [f'fu_api_backoff_seconds_total{{job="{job}",kind="{kind}"}} {seconds}'
+                  for kind, seconds in summary['backoff_seconds'].items()]
+        if summary['rate_limit_remaining']:
+            lines += ['# HELP fu_rate_limit_remaining Primary rate limit left at the end of the run',
+                      '# TYPE fu_rate_limit_remaining gauge',
+                      f'fu_rate_limit_remaining{{job="{job}"}} {summary["rate_limit_remaining"][-1][1]}']
+        if summary['accounts']:
+            lines += ['# HELP fu_account_rate_limit_remaining Primary rate limit left per managed account token',
+                      '# TYPE fu_account_rate_limit_remaining gauge']
+            lines += [f'fu_account_rate_limit_remaining{{job="{job}",account="{account}"}} {usage["rate_limit_remaining"]}'
+                      for account, usage in summary['accounts'].items() if usage['rate_limit_remaining'] is not None]
+        lines += ['# HELP fu_stage_duration_seconds Time spent in each stage of the run',
+                  '# TYPE fu_stage_duration_seconds gauge']
+        lines += [f'fu_stage_duration_seconds{{job="{job}",stage="{stage}"}} {seconds}'
+                  for stage, seconds in summary['stage_seconds'].items()]
+        if summary['caches']:
+            lines += ['# HELP fu_cache_hit_ratio Share of lookups served from a local cache',
+                      '# TYPE fu_cache_hit_ratio gauge']
+            lines += [f'fu_cache_hit_ratio{{job="{job}",cache="{name}"}} {stats.get("hit_rate", 0)}'
+                      for name, stats in summary['caches'].items()]
+            lines += ['# HELP fu_cache_served_age_hours Age of the cached records served, mean and max',
+                      '# TYPE fu_cache_served_age_hours gauge']
+            lines += [f'fu_cache_served_age_hours{{job="{job}",cache="{name}",stat="{stat}"}} {stats[f"{stat}_age_hours"]}'
+                      for name, stats in summary['caches'].items() for stat in ('mean', 'max')
+                      if f'{stat}_age_hours' in stats]
+        lines += ['# HELP fu_last_run_timestamp_seconds Time the run finished',
+                  '# TYPE fu_last_run_timestamp_seconds gauge',
+                  f'fu_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self, job):
+        """
+        Write the JSON run summary, and the Prometheus textfile if METRICS_TEXTFILE_DIR is set
+
+        Files are replaced atomically, so a collector never reads a partial file.
+
+        Args:
+            job (str): Entry point name, used in the file names
+        """
+        outputs = [(os.path.join(METRICS_DIR, f'run_summary_{job}.json'), json.dumps(self.summary(), indent=2))]
+        if METRICS_TEXTFILE_DIR:
+            outputs.append((os.path.join(METRICS_TEXTFILE_DIR, f'fu_{job}.prom'), self.to_prometheus(job)))
+        for path, content in outputs:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(f'{path}.tmp', 'w') as f:
+                f.write(content)
+            os.replace(f'{path}.tmp', path)
+
+# Metrics of this process, shared by the API client, the scheduler and the entry points
+metrics = Metrics()
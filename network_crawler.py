@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from http_cache import CACHE_DIR
+from rate_limit import RateLimitScheduler
+
+# Hops beyond the account's own followers and following that are crawled (0 = no crawl)
+CRAWL_DEPTH = int(os.getenv('CRAWL_DEPTH', '0'))
+# API requests a single run may spend on the crawl
+CRAWL_API_BUDGET = int(os.getenv('CRAWL_API_BUDGET', '200'))
+# Number of users whose followers are fetched concurrently
+CRAWL_WORKERS = int(os.getenv('CRAWL_WORKERS', '4'))
+# Crawl requests per second when GitHub is not pushing back
+CRAWL_RATE = float(os.getenv('CRAWL_RATE', '5'))
+# Days after which a finished crawl is started over to pick up changed relationships
+CRAWL_REFRESH_DAYS = float(os.getenv('CRAWL_REFRESH_DAYS', '30'))
+
+class NetworkCrawler:
+    """
+    Breadth-first crawl of the followers of an account's connections
+
+    The account's followers and following are at distance 1. Expanding a
+    user fetches the first page of its followers, which gives the edges
+    into it; users within `max_depth` hops are kept and expanded in turn.
+    Each run spends at most `budget` requests, and the frontier, visited
+    set and edges are stored so the next run continues where this one
+    stopped. Requests are paced by a RateLimitScheduler and retried after
+    the backoff it asks for; retries count against the budget too.
+    """
+
+    def __init__(self, client, username, path=None, max_depth=CRAWL_DEPTH, budget=CRAWL_API_BUDGET,
+                 workers=CRAWL_WORKERS, scheduler=None, refresh_days=CRAWL_REFRESH_DAYS):
+        self.client = client
+        self.username = username
+        self.path = path or os.path.join(CACHE_DIR, f'crawl_{username}.json')
+        self.max_depth = max_depth
+        self.budget = budget
+        self.workers = max(1, workers)
+        self.scheduler = scheduler or RateLimitScheduler(rate=CRAWL_RATE, burst=CRAWL_RATE * 2)
+        self.refresh = refresh_days * 86400
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Restore the crawl state of previous runs, starting over once it is stale"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if state.get('started_at', 0) < time.time() - self.refresh or state.get('max_depth') != self.max_depth:
+            state = {}
+        self.started_at = state.get('started_at', time.time())
+        self.frontier = deque(tuple(item) for item in state.get('frontier', []))
+        self.visited = set(state.get('visited', []))
+        # Every user within max_depth hops, with its distance from the account
+        self.known = dict(state.get('known', {}))
+        # Edges of the account itself are known exactly from its fresh lists, older
+        # state may still hold copies of them that have gone stale since
+        self.edges = set(tuple(edge) for edge in state.get('edges', []) if self.username not in edge)
+
+    def save(self):
+        """Store the crawl state atomically"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f'{self.path}.tmp', 'w') as f:
+            json.dump({
+                'started_at': self.started_at,
+                'max_depth': self.max_depth,
+                'frontier': list(self.frontier),
+                'visited': list(self.visited),
+                'known': self.known,
+                'edges': sorted(self.edges)
+            }, f)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def _spend_request(self):
+        """Count one request against the budget, False once the budget is used up"""
+        with self._requests_lock:
+            if self.requests >= self.budget:
+                return False
+            self.requests += 1
+            return True
+
+    def _fetch_followers(self, login, retries=3):
+        """
+        Fetch the first page of a user's followers
+
+        Returns:
+            list: Follower logins, or None if the request failed or the budget ran
+            out, and the user should be retried in a later run
+        """
+        for attempt in range(retries):
+            self.scheduler.acquire()
+            if not self._spend_request():
+                return None
+            try:
+                response = self.client.get(f'/users/{login}/followers?per_page=100')
+            except requests.RequestException as e:
+                delay = self.scheduler.pause(2 ** attempt)
+                print(f'Crawl request for {login} failed: {e}. Pausing {delay:.0f}s...')
+                continue
+            self.scheduler.observe(response)
+            if response.status_code == 200:
+                return [user['login'] for user in response.json()]
+            if response.status_code == 404:
+                # Deleted or suspended account
+                return []
+            kind, delay = self.scheduler.backoff(response, attempt)
+            if kind is None:
+                return []
+            print(f'Crawl request failed ({kind}). Pausing {delay:.0f}s...')
+        return None
+
+    def _expand(self, login, distance, followers):
+        """Record the edges into an expanded user and queue newly found users"""
+        self.visited.add(login)
+        for follower in followers:
+            if follower == self.username:
+                # The account's own relationships come from its lists, not the crawl
+                continue
+            if follower not in self.known and distance + 1 <= self.max_depth:
+                self.known[follower] = distance + 1
+                self.frontier.append((follower, distance + 1))
+            if follower in self.known:
+                self.edges.add((follower, login))
+
+    def crawl(self, seeds):
+        """
+        Continue the crawl within this run's request budget
+
+        Args:
+            seeds (list): The account's followers and following; ones not seen
+                before are queued behind the current frontier
+
+        Returns:
+            list: (follower, followed) edges between users within max_depth hops,
+            none of them touching the account itself
+        """
+        self.known.setdefault(self.username, 0)
+        for login in seeds:
+            if login not in self.known:
+                self.known[login] = 1
+                self.frontier.append((login, 1))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Batches run one after another, so requests is not being updated while it is read here
+            while self.frontier and self.requests < self.budget:
+                batch = []
+                while self.frontier and len(batch) < min(self.workers, self.budget - self.requests):
+                    login, distance = self.frontier.popleft()
+                    if login not in self.visited:
+                        batch.append((login, distance))
+                results = executor.map(lambda item: self._fetch_followers(item[0]), batch)
+                for (login, distance), followers in zip(batch, results):
+                    if followers is None:
+                        self.frontier.append((login, distance))
+                    else:
+                        self._expand(login, distance, followers)
+
+        self.save()
+        print(f"Crawl: {len(self.visited)} users expanded, {len(self.frontier)} queued, "
+              f"{len(self.edges)} edges ({self.requests} requests this run)")
+        return sorted(self.edges)
@@ -0,0 +1,107 @@
+import os
+import json
+import math
+import numpy as np
+from http_cache import CACHE_DIR
+
+# Layout algorithm: 'radial' places nodes on rings by relationship, 'spring' runs a force-directed simulation
+NETWORK_LAYOUT = os.getenv('NETWORK_LAYOUT', 'radial')
+# Maximum number of nodes on one ring before it is split into interleaved sub-rings
+RING_CAPACITY = int(os.getenv('RING_CAPACITY', '720'))
+
+# Ring radius of each node type, the main user sits at the origin
+RING_RADIUS = {'mutual': 1.0, 'follower': 2.0, 'following': 3.0, 'extended': 4.0}
+# Radial distance between the sub-rings of a crowded ring
+SUB_RING_SPACING = 0.25
+
+def _ordered(nodes, previous):
+    """Order nodes by their angle in the previous layout, new nodes after them"""
+    known = [node for node in nodes if node in previous]
+    known.sort(key=lambda node: math.atan2(previous[node][1], previous[node][0]) % (2 * math.pi))
+    return known + [node for node in nodes if node not in previous]
+
+def radial_layout(groups, previous=None, ring_capacity=RING_CAPACITY):
+    """
+    Place nodes on concentric rings by type
+
+    Nodes of a type are spread evenly around their ring, in the angular
+    order they had in the previous layout so positions stay stable from
+    one day to the next. A ring holding more than ring_capacity nodes is
+    split into sub-rings that nodes alternate between.
+
+    Args:
+        groups (dict): Node type -> list of nodes; the 'main' type is placed at the origin
+        previous (dict): Positions of a previous layout, node -> (x, y)
+        ring_capacity (int): Nodes per ring before sub-rings are added
+
+    Returns:
+        dict: Node -> (x, y)
+    """
+    previous = previous or {}
+    pos = {node: (0.0, 0.0) for node in groups.get('main', [])}
+    for node_type, radius in RING_RADIUS.items():
+        nodes = _ordered(groups.get(node_type, []), previous)
+        if not nodes:
+            continue
+        count = len(nodes)
+        sub_rings = max(1, math.ceil(count / ring_capacity))
+        index = np.arange(count)
+        angles = 2 * np.pi * index / count
+        radii = radius + SUB_RING_SPACING * (index % sub_rings - (sub_rings - 1) / 2) / sub_rings
+        pos.update(zip(nodes, zip((radii * np.cos(angles)).tolist(), (radii * np.sin(angles)).tolist())))
+    return pos
+
+class LayoutEngine:
+    """
+    Compute node positions once per run and share them between renderers
+
+    Positions are stored after each run and seed the next one: the radial
+    layout keeps the angular order of known nodes, and the spring layout
+    starts from the previous positions, so only new nodes need to settle.
+    """
+
+    def __init__(self, username, path=None, method=NETWORK_LAYOUT):
+        self.path = path or os.path.join(CACHE_DIR, f'layout_{username}.json')
+        self.method = method
+        self.previous = self._load()
+
+    def _load(self):
+        """Load the positions of the previous run"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {node: tuple(xy) for node, xy in data.get('positions', {}).items()}
+
+    def save(self, pos):
+        """Store positions to seed the next run's layout"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f'{self.path}.tmp', 'w') as f:
+            json.dump({'method': self.method, 'positions': {node: [round(x, 5), round(y, 5)] for node, (x, y) in pos.items()}}, f)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def compute(self, G):
+        """
+        Lay out a network graph built by generate_network_graph
+
+        Args:
+            G (networkx.DiGraph): Graph whose nodes carry a 'type' attribute
+
+        Returns:
+            dict: Node -> (x, y)
+        """
+        if self.method == 'spring':
+            import networkx as nx
+            seed = {node: self.previous[node] for node in G if node in self.previous}
+            # Known nodes start where they were, so far fewer iterations are needed to settle
+            iterations = 15 if len(seed) > len(G) / 2 else 50
+            pos = nx.spring_layout(G, k=0.3, iterations=iterations, pos=seed or None, seed=0)
+            pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+        else:
+            groups = {}
+            for node, node_type in G.nodes(data='type'):
+                groups.setdefault(node_type, []).append(node)
+            pos = radial_layout(groups, self.previous)
+        self.save(pos)
+        return pos
@@ -8,28 +8,95 @@ and generated visualizations.
 
 The script does not require a database, instead it:
 1. Fetches current follower/following data from GitHub API
-2. Saves raw data as CSV for historical comparison
+2. Saves the lists to a compact snapshot history for historical comparison
 3. Creates a network graph visualization
 4. Saves both static images and interactive HTML versions
 """
 
 import os
 import json
-import requests
 import csv
+import heapq
 import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import networkx as nx
-import matplotlib.pyplot as plt
-import pandas as pd
-import plotly.graph_objects as go
-from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache, wraps
+from github_api import GitHubClient
+from github_graphql import GITHUB_BACKEND, GraphQLBackend, empty_profile
+from http_cache import ETagCache
+from incremental_sync import INCREMENTAL_SYNC, IncrementalSync
+from metrics import metrics
+from network_crawler import CRAWL_DEPTH, NetworkCrawler
+from profile_cache import ProfileCache
+from snapshot import FollowSnapshot
+from snapshot_store import SnapshotStore
+
+# NumPy, networkx, matplotlib, plotly and PIL are imported inside the stages
+# that use them, so fetching and saving snapshots starts quickly
 
 # Get environment variables
 GITHUB_TOKEN = os.getenv('TOKEN')
 GITHUB_USERNAME = os.getenv('USERNAME')
 
-headers = {'Authorization': f'token {GITHUB_TOKEN}'}
+# Node count above which the interactive graph is rendered with WebGL
+PLOTLY_WEBGL_THRESHOLD = int(os.getenv('PLOTLY_WEBGL_THRESHOLD', '5000'))
+# Worker processes running the render stages concurrently (1 = one after another)
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '3'))
+# Node count up to which the static graph is drawn with every label and curved arrows
+MATPLOTLIB_DETAIL_MAX_NODES = int(os.getenv('MATPLOTLIB_DETAIL_MAX_NODES', '300'))
+# Node count above which the static graph draws a density image instead of points and edges
+MATPLOTLIB_DENSITY_MIN_NODES = int(os.getenv('MATPLOTLIB_DENSITY_MIN_NODES', '20000'))
+# Number of users labelled in the static graph once it is too large to label every node
+MATPLOTLIB_LABEL_TOP_K = int(os.getenv('MATPLOTLIB_LABEL_TOP_K', '25'))
+# Uncached profiles fetched per run to rank the label candidates (0 = rank from cached profiles only)
+MATPLOTLIB_LABEL_FETCH_MAX = int(os.getenv('MATPLOTLIB_LABEL_FETCH_MAX', '100'))
+# Bins per axis of the density image
+MATPLOTLIB_DENSITY_BINS = 400
+
+# Profiles already fetched in this run, keyed by login
+known_profiles = {}
+
+# The API state below is created on first use, so importing this module has no side effects
+
+# Held while a getter below runs, reentrant since some of them call get_client()
+_create_lock = threading.RLock()
+
+def _created_once(factory):
+    """
+    Cache a getter's result, creating it only once even if threads race to the first call
+    
+    lru_cache alone does not serialise the first call, and the two list
+    fetch threads would each build their own client and page cache.
+    """
+    cached = lru_cache(maxsize=None)(factory)
+    
+    @wraps(factory)
+    def getter():
+        with _create_lock:
+            return cached()
+    getter.cache_info = cached.cache_info
+    return getter
+
+@_created_once
+def get_client():
+    """Pooled GitHub API client used for every request, with the conditional-request page cache"""
+    return GitHubClient(GITHUB_TOKEN, cache=ETagCache())
+
+@_created_once
+def get_delta_sync():
+    """Pages only through list changes since the previous run when INCREMENTAL_SYNC is set"""
+    return IncrementalSync(get_client(), GITHUB_USERNAME)
+
+@_created_once
+def get_graphql():
+    """GraphQL backend fetching lists and profiles together, None unless GITHUB_BACKEND=graphql"""
+    return GraphQLBackend(get_client()) if GITHUB_BACKEND == 'graphql' else None
+
+@_created_once
+def get_profile_cache():
+    """Profiles kept between runs, refreshed once their TTL expires"""
+    return ProfileCache()
 
 def get_github_user_list(endpoint, per_page=100):
     """
@@ -42,260 +109,369 @@ def get_github_user_list(endpoint, per_page=100):
     Returns:
         list: List of GitHub usernames
     """
-    users = []
-    page = 1
-    while True:
-        url = f'https://api.github.com/users/{GITHUB_USERNAME}/{endpoint}?per_page={per_page}&page={page}'
-        response = requests.get(url, headers=headers)
-        data = response.json()
-        if not data:
-            break
-        users.extend([user['login'] for user in data])
-        page += 1
-    return users
+    graphql = get_graphql()
+    if graphql is not None:
+        users, profiles = graphql.fetch_user_list(GITHUB_USERNAME, endpoint)
+        known_profiles.update(profiles)
+        get_profile_cache().put_many(profiles)
+        return users
+    if INCREMENTAL_SYNC:
+        return get_delta_sync().fetch(endpoint, per_page)
+    return get_client().fetch_user_list(GITHUB_USERNAME, endpoint, per_page)
+
+def _profile_from_rest(data):
+    """Convert a REST user object into profile data"""
+    return {
+        'login': data.get('login'),
+        'name': data.get('name', ''),
+        'public_repos': data.get('public_repos', 0),
+        'followers': data.get('followers', 0),
+        'following': data.get('following', 0),
+        'created_at': data.get('created_at', ''),
+        'bio': data.get('bio', '')[:100] if data.get('bio') else ''  # Truncate bio to avoid very long text
+    }
+
+def _fetch_profile_rest(username, etag=None):
+    """
+    Fetch a single profile over REST, revalidating a cached copy if an ETag is given
+    
+    Returns:
+        tuple: (profile data, or None if not modified, ETag of the response)
+    """
+    response = get_client().get(f'/users/{username}', headers={'If-None-Match': etag} if etag else None)
+    if etag and response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return _profile_from_rest(response.json()), response.headers.get('ETag')
 
 def fetch_user_data(username):
     """Fetch basic profile data for a GitHub user"""
-    url = f'https://api.github.com/users/{username}'
-    try:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'login': data.get('login'),
-                'name': data.get('name', ''),
-                'public_repos': data.get('public_repos', 0),
-                'followers': data.get('followers', 0),
-                'following': data.get('following', 0),
-                'created_at': data.get('created_at', ''),
-                'bio': data.get('bio', '')[:100] if data.get('bio') else ''  # Truncate bio to avoid very long text
-            }
-    except Exception as e:
-        print(f"Error fetching data for {username}: {e}")
-    
-    # Return minimal data if API call fails
-    return {'login': username, 'name': '', 'public_repos': 0, 'followers': 0, 'following': 0, 'created_at': '', 'bio': ''}
-
-def save_data_to_csv(followers, following):
-    """Save current follower/following data as CSV"""
-    today = datetime.now().strftime('%Y-%m-%d')
+    return fetch_users_data([username])[username]
+
+def fetch_users_data(usernames):
+    """
+    Fetch basic profile data for many GitHub users
     
-    # Create followers CSV
-    with open(f'network_data/followers_{today}.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['username'])
-        for user in followers:
-            writer.writerow([user])
+    Profiles are served from the local profile cache while fresh. Misses are
+    filled by batched GraphQL queries (reusing profiles already returned by a
+    GraphQL list fetch), or by concurrent REST calls otherwise.
     
-    # Create following CSV
-    with open(f'network_data/following_{today}.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['username'])
-        for user in following:
-            writer.writerow([user])
+    Args:
+        usernames (list): GitHub usernames
+        
+    Returns:
+        dict: Mapping of username to profile data
+    """
+    graphql = get_graphql()
+    profile_cache = get_profile_cache()
+    if graphql is None:
+        profiles = profile_cache.get_profiles(usernames, fetch_one=_fetch_profile_rest)
+    else:
+        def fetch_many(missing):
+            fetched = {username: known_profiles[username] for username in missing if username in known_profiles}
+            remaining = [username for username in missing if username not in fetched]
+            if remaining:
+                fetched.update(graphql.fetch_profiles(remaining))
+            return fetched
+        profiles = profile_cache.get_profiles(usernames, fetch_many=fetch_many)
+    
+    # Return minimal data for users whose profile could not be fetched
+    return {username: profiles.get(username) or empty_profile(username) for username in usernames}
+
+def cached_follower_counts(usernames):
+    """
+    Follower counts of users whose profile is in the local profile cache
+    
+    Expired profiles are used as they are, nothing is fetched from GitHub.
+    The cache is only peeked at, so its hit rate and eviction order keep
+    reflecting the profiles actually served.
+    
+    Returns:
+        dict: Mapping of username to follower count
+    """
+    profiles = get_profile_cache().peek(usernames)
+    return {username: profile.get('followers', 0) for username, profile in profiles.items()}
+
+def label_scores_for(compact, fetch_max=MATPLOTLIB_LABEL_FETCH_MAX):
+    """
+    Follower counts used to pick the users labelled in a large static graph
+    
+    Counts come from the profile cache. Users without a cached profile are
+    ranked by their number of followers within the graph (crawled edges
+    included), ties in API order, and the first fetch_max of them are
+    fetched so the ranking does not depend on something else having filled
+    the cache.
+    
+    Args:
+        compact (CompactGraph): Graph of the account, the account at id 0
+        fetch_max (int): Maximum number of profiles fetched
+        
+    Returns:
+        dict: Mapping of username to follower count
+    """
+    import numpy as np
+    scores = cached_follower_counts(compact.logins(range(1, compact.number_of_nodes())))
+    # Stable sort keeps API order among users with the same in-graph follower count
+    ranked = compact.logins(np.argsort(-compact.in_degree()[1:], kind='stable') + 1)
+    missing = [username for username in ranked if username not in scores][:max(0, fetch_max)]
+    if missing:
+        scores.update((username, profile.get('followers', 0))
+                      for username, profile in fetch_users_data(missing).items())
+    return scores
+
+def save_snapshot(followers, following):
+    """Save current follower/following data to the snapshot history"""
+    store = SnapshotStore(GITHUB_USERNAME)
+    if not store.days():
+        # Carry over the history kept as daily CSV files by earlier versions
+        imported = store.import_csv('network_data')
+        if imported:
+            print(f"Imported {imported} days of CSV history into the snapshot store")
+    store.save(followers, following)
     
-    # Create relationship CSV
-    with open(f'network_data/network_{today}.csv', 'w', newline='') as f:
+    today = datetime.now().strftime('%Y-%m-%d')
+    print(f"Snapshot saved for {today} ({len(store.days())} days of history)")
+
+def save_crawl_edges(edges):
+    """Save the relationships found by the network crawler as CSV"""
+    with open(f'network_data/crawl_edges_{GITHUB_USERNAME}.csv', 'w', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(['source', 'target', 'relationship'])
-        
-        # You follow these users
-        for user in following:
-            writer.writerow([GITHUB_USERNAME, user, 'following'])
-        
-        # These users follow you
-        for user in followers:
-            writer.writerow([user, GITHUB_USERNAME, 'following'])
+        writer.writerows((source, target, 'following') for source, target in edges)
+    print(f"Saved {len(edges)} crawled relationships to crawl_edges_{GITHUB_USERNAME}.csv")
+
+def partition_network(followers, following):
+    """
+    Split the network into mutual, followers-only and following-only users
     
-    print(f"Data saved to CSV files with date {today}")
+    Returns:
+        dict: Node type ('mutual', 'follower', 'following') -> list of logins in API order
+    """
+    follower_set = set(followers)
+    following_set = set(following)
+    return {
+        'mutual': [user for user in followers if user in following_set],
+        'follower': [user for user in followers if user not in following_set],
+        'following': [user for user in following if user not in follower_set]
+    }
 
-def generate_network_graph(followers, following):
-    """Generate a NetworkX graph of follower/following relationships"""
+def generate_network_graph(followers, following, partition=None, crawl_edges=None):
+    """
+    Generate a NetworkX graph of follower/following relationships
+    
+    Args:
+        followers (list): Users following the account
+        following (list): Users the account follows
+        partition (dict): Result of partition_network, computed if not given
+        crawl_edges (list): Optional (follower, followed) edges found by the network
+            crawler; users outside the account's own network are added as 'extended'
+    """
+    import networkx as nx
+    partition = partition or partition_network(followers, following)
     G = nx.DiGraph()
     
     # Add the main user
     G.add_node(GITHUB_USERNAME, type='main')
     
-    # Add followers and following
-    mutual = set(followers) & set(following)
-    followers_only = set(followers) - mutual
-    following_only = set(following) - mutual
-    
     # Add different types of users
-    for user in mutual:
-        G.add_node(user, type='mutual')
-    
-    for user in followers_only:
-        G.add_node(user, type='follower')
-    
-    for user in following_only:
-        G.add_node(user, type='following')
+    for node_type, users in partition.items():
+        G.add_nodes_from(users, type=node_type)
     
     # Add edges
-    for user in followers:
-        G.add_edge(user, GITHUB_USERNAME)
+    G.add_edges_from((user, GITHUB_USERNAME) for user in followers)
+    G.add_edges_from((GITHUB_USERNAME, user) for user in following)
     
-    for user in following:
-        G.add_edge(GITHUB_USERNAME, user)
+    # Add relationships between users found by the crawler
+    for source, target in crawl_edges or []:
+        for user in (source, target):
+            if user not in G:
+                G.add_node(user, type='extended')
+        G.add_edge(source, target)
     
     return G
 
-def create_matplotlib_visualization(G):
-    """Create a static visualization using matplotlib"""
-    plt.figure(figsize=(14, 10))
-    
-    # Define positions
-    pos = nx.spring_layout(G, k=0.3, iterations=50)
-    
-    # Define node colors based on type
-    color_map = []
-    for node in G:
-        if node == GITHUB_USERNAME:
-            color_map.append('red')
-        elif G.nodes[node]['type'] == 'mutual':
-            color_map.append('purple')
-        elif G.nodes[node]['type'] == 'follower':
-            color_map.append('green')
-        else:  # following
-            color_map.append('blue')
-    
-    # Draw the graph
-    nx.draw(G, pos, with_labels=True, node_color=color_map, 
-            node_size=500, arrows=True, connectionstyle='arc3,rad=0.1',
-            font_size=8, font_weight='bold')
+# Color of each node type in both renderers
+NODE_COLORS = {'main': 'red', 'mutual': 'purple', 'follower': 'green', 'following': 'blue', 'extended': 'gray'}
+
+def _draw_bulk(G, pos, ax, dense):
+    """Draw a large graph as a few rasterized collections, or as a density image if dense"""
+    import numpy as np
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import to_rgb
+    from network_layout import RING_RADIUS
+    nodes = {node_type: [] for node_type in NODE_COLORS}
+    for node, node_type in G.nodes(data='type'):
+        nodes[node_type].append(node)
+    xy = {node_type: np.array([pos[node] for node in members], dtype=float).reshape(-1, 2)
+          for node_type, members in nodes.items()}
+    
+    if dense:
+        # Bin the nodes of each type; a pixel takes the color of its most common type,
+        # and its opacity from the log of the total number of nodes in it
+        everything = np.concatenate(list(xy.values()))
+        (xmin, ymin), (xmax, ymax) = everything.min(axis=0), everything.max(axis=0)
+        bins = MATPLOTLIB_DENSITY_BINS
+        image = np.zeros((bins, bins, 4))
+        total = np.zeros((bins, bins))
+        best = np.zeros((bins, bins))
+        for node_type in RING_RADIUS:
+            counts, _, _ = np.histogram2d(xy[node_type][:, 1], xy[node_type][:, 0], bins=bins,
+                                          range=[[ymin, ymax], [xmin, xmax]])
+            image[counts > best, :3] = to_rgb(NODE_COLORS[node_type])
+            best = np.maximum(best, counts)
+            total += counts
+        image[..., 3] = np.log1p(total) / np.log1p(max(total.max(), 1))
+        ax.imshow(image, extent=(xmin, xmax, ymin, ymax), origin='lower', interpolation='nearest')
+    else:
+        edges = list(G.edges())
+        segments = np.array([(pos[source], pos[target]) for source, target in edges], dtype=float).reshape(-1, 2, 2)
+        ax.add_collection(LineCollection(segments, colors='#888', linewidths=0.2, alpha=0.3, rasterized=True))
+        for node_type in RING_RADIUS:
+            ax.scatter(xy[node_type][:, 0], xy[node_type][:, 1], s=6, c=NODE_COLORS[node_type],
+                       linewidths=0, rasterized=True)
+    
+    ax.scatter(xy['main'][:, 0], xy['main'][:, 1], s=200, c=NODE_COLORS['main'], zorder=3)
+    ax.set_aspect('equal')
+    ax.autoscale_view()
+    ax.set_axis_off()
+
+def _draw_top_labels(G, pos, ax, label_scores):
+    """Label the main user and the MATPLOTLIB_LABEL_TOP_K highest scoring users"""
+    # Users without a known score are never labelled, arbitrary picks would only add clutter
+    label_scores = label_scores or {}
+    candidates = [node for node, score in label_scores.items()
+                  if score and node in G and node != GITHUB_USERNAME]
+    top = heapq.nlargest(MATPLOTLIB_LABEL_TOP_K, candidates, key=label_scores.get)
+    for node in [GITHUB_USERNAME] + top:
+        x, y = pos[node]
+        ax.annotate(node, (x, y), xytext=(0, 4), textcoords='offset points', ha='center',
+                    fontsize=8 if node == GITHUB_USERNAME else 6, fontweight='bold')
+
+def create_matplotlib_visualization(G, pos, label_scores=None):
+    """
+    Create a static visualization using matplotlib from precomputed node positions
+    
+    Graphs of up to MATPLOTLIB_DETAIL_MAX_NODES nodes are drawn in full detail,
+    with every label and curved arrows. Larger graphs are drawn in bulk as
+    rasterized collections with straight edges, labelling only the
+    MATPLOTLIB_LABEL_TOP_K highest scoring users. Above
+    MATPLOTLIB_DENSITY_MIN_NODES nodes become a density image without edges,
+    so rendering time stays roughly flat as the network grows.
+    
+    Args:
+        G (networkx.DiGraph): Graph built by generate_network_graph
+        pos (dict): Node -> (x, y)
+        label_scores (dict): Optional login -> score (e.g. follower count) choosing the labelled users
+    """
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    fig = plt.figure(figsize=(14, 10))
+    ax = fig.gca()
+    node_count = G.number_of_nodes()
+    
+    if node_count <= MATPLOTLIB_DETAIL_MAX_NODES:
+        # Define node colors based on type
+        color_map = [NODE_COLORS[node_type] for _, node_type in G.nodes(data='type')]
+        
+        # Draw the graph
+        nx.draw(G, pos, ax=ax, with_labels=True, node_color=color_map, 
+                node_size=500, arrows=True, connectionstyle='arc3,rad=0.1',
+                font_size=8, font_weight='bold')
+    else:
+        _draw_bulk(G, pos, ax, dense=node_count > MATPLOTLIB_DENSITY_MIN_NODES)
+        _draw_top_labels(G, pos, ax, label_scores)
     
     # Add a legend
     legend_elements = [
         plt.Line2D([0], [0], marker='o', color='w', label=f'You ({GITHUB_USERNAME})',
-                  markerfacecolor='red', markersize=10),
+                  markerfacecolor=NODE_COLORS['main'], markersize=10),
         plt.Line2D([0], [0], marker='o', color='w', label='Mutual Followers',
-                  markerfacecolor='purple', markersize=10),
+                  markerfacecolor=NODE_COLORS['mutual'], markersize=10),
         plt.Line2D([0], [0], marker='o', color='w', label='Followers Only',
-                  markerfacecolor='green', markersize=10),
+                  markerfacecolor=NODE_COLORS['follower'], markersize=10),
         plt.Line2D([0], [0], marker='o', color='w', label='Following Only',
-                  markerfacecolor='blue', markersize=10)
+                  markerfacecolor=NODE_COLORS['following'], markersize=10)
     ]
-    plt.legend(handles=legend_elements, loc='upper left')
+    if any(node_type == 'extended' for _, node_type in G.nodes(data='type')):
+        legend_elements.append(plt.Line2D([0], [0], marker='o', color='w', label='Second Degree',
+                                          markerfacecolor=NODE_COLORS['extended'], markersize=10))
+    ax.legend(handles=legend_elements, loc='upper left')
     
     # Add title and other details
     today = datetime.now().strftime('%Y-%m-%d')
-    plt.title(f"GitHub Network for {GITHUB_USERNAME} - {today}")
-    plt.tight_layout()
+    ax.set_title(f"GitHub Network for {GITHUB_USERNAME} - {today}")
+    fig.tight_layout()
     
     # Save the figure
-    plt.savefig(f'visualizations/network_graph_{today}.png', dpi=300)
+    fig.savefig(f'visualizations/network_graph_{today}.png', dpi=300)
+    plt.close(fig)
     print(f"Static visualization saved as network_graph_{today}.png")
 
-def create_plotly_visualization(G, followers, following):
-    """Create an interactive visualization using plotly"""
-    # Create edge traces
-    edge_x = []
-    edge_y = []
-    
-    pos = nx.spring_layout(G, k=0.3, iterations=50)
-    
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
+# Plotly trace style of each node type: (legend name, color, marker size, outline width)
+PLOTLY_NODE_STYLES = {
+    'main': (None, NODE_COLORS['main'], 20, 2),
+    'mutual': ('Mutual Followers', NODE_COLORS['mutual'], 15, 1),
+    'follower': ('Followers Only', NODE_COLORS['follower'], 10, 1),
+    'following': ('Following Only', NODE_COLORS['following'], 10, 1),
+    'extended': ('Second Degree', NODE_COLORS['extended'], 6, 0)
+}
+
+def create_plotly_visualization(G, pos):
+    """
+    Create an interactive visualization using plotly from precomputed node positions
     
-    edge_trace = go.Scatter(
-        x=edge_x, y=edge_y,
+    Traces are built in one pass from NumPy arrays. Above PLOTLY_WEBGL_THRESHOLD
+    nodes the WebGL Scattergl trace is used and node labels are left to the
+    hover text, which keeps large networks responsive in the browser.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+    large = G.number_of_nodes() > PLOTLY_WEBGL_THRESHOLD
+    scatter = go.Scattergl if large else go.Scatter
+    
+    # Create edge trace, NaN between segments breaks the line
+    edges = list(G.edges())
+    edge_xy = np.full((len(edges) * 3, 2), np.nan)
+    if edges:
+        edge_xy[0::3] = [pos[source] for source, _ in edges]
+        edge_xy[1::3] = [pos[target] for _, target in edges]
+    
+    edge_trace = scatter(
+        x=edge_xy[:, 0], y=edge_xy[:, 1],
         line=dict(width=0.5, color='#888'),
         hoverinfo='none',
-        mode='lines')
+        mode='lines',
+        showlegend=False)
+    
+    # Group nodes by type in a single pass
+    groups = {node_type: [] for node_type in PLOTLY_NODE_STYLES}
+    for node, node_type in G.nodes(data='type'):
+        groups[node_type].append(node)
     
     # Create node traces for different types
-    main_trace = go.Scatter(
-        x=[], y=[],
-        mode='markers+text',
-        name=GITHUB_USERNAME,
-        marker=dict(
-            color='red',
-            size=20,
-            line=dict(width=2, color='DarkSlateGrey')
-        ),
-        text=[],
-        textposition="bottom center",
-        hoverinfo='text'
-    )
-    
-    mutual_trace = go.Scatter(
-        x=[], y=[],
-        mode='markers+text',
-        name='Mutual Followers',
-        marker=dict(
-            color='purple',
-            size=15,
-            line=dict(width=1, color='DarkSlateGrey')
-        ),
-        text=[],
-        textposition="bottom center",
-        hoverinfo='text'
-    )
-    
-    follower_trace = go.Scatter(
-        x=[], y=[],
-        mode='markers+text',
-        name='Followers Only',
-        marker=dict(
-            color='green',
-            size=10,
-            line=dict(width=1, color='DarkSlateGrey')
-        ),
-        text=[],
-        textposition="bottom center",
-        hoverinfo='text'
-    )
-    
-    following_trace = go.Scatter(
-        x=[], y=[],
-        mode='markers+text',
-        name='Following Only',
-        marker=dict(
-            color='blue',
-            size=10,
-            line=dict(width=1, color='DarkSlateGrey')
-        ),
-        text=[],
-        textposition="bottom center",
-        hoverinfo='text'
-    )
-    
-    # Add nodes to traces
-    mutual_set = set(followers) & set(following)
-    
-    for node in G.nodes():
-        x, y = pos[node]
-        hover_text = f"User: {node}"
-        
-        if node == GITHUB_USERNAME:
-            main_trace['x'] += tuple([x])
-            main_trace['y'] += tuple([y])
-            main_trace['text'] += tuple([node])
-            main_trace['hovertext'] = hover_text
-        elif node in mutual_set:
-            mutual_trace['x'] += tuple([x])
-            mutual_trace['y'] += tuple([y])
-            mutual_trace['text'] += tuple([node])
-            mutual_trace['hovertext'] = hover_text
-        elif node in followers:
-            follower_trace['x'] += tuple([x])
-            follower_trace['y'] += tuple([y])
-            follower_trace['text'] += tuple([node])
-            follower_trace['hovertext'] = hover_text
-        else:
-            following_trace['x'] += tuple([x])
-            following_trace['y'] += tuple([y])
-            following_trace['text'] += tuple([node])
-            following_trace['hovertext'] = hover_text
+    node_traces = []
+    for node_type, (name, color, size, outline) in PLOTLY_NODE_STYLES.items():
+        nodes = groups[node_type]
+        xy = np.array([pos[node] for node in nodes], dtype=float).reshape(-1, 2)
+        node_traces.append(scatter(
+            x=xy[:, 0], y=xy[:, 1],
+            mode='markers' if large and node_type != 'main' else 'markers+text',
+            name=name or GITHUB_USERNAME,
+            marker=dict(
+                color=color,
+                size=size,
+                line=dict(width=outline, color='DarkSlateGrey')
+            ),
+            text=nodes,
+            textposition="bottom center",
+            hovertext=[f"User: {node}" for node in nodes],
+            hoverinfo='text'
+        ))
     
     # Create figure
-    fig = go.Figure(data=[edge_trace, main_trace, mutual_trace, follower_trace, following_trace],
+    fig = go.Figure(data=[edge_trace] + node_traces,
                  layout=go.Layout(
-                    title=f'GitHub Network for {GITHUB_USERNAME}',
-                    titlefont=dict(size=16),
+                    title=dict(text=f'GitHub Network for {GITHUB_USERNAME}', font=dict(size=16)),
                     showlegend=True,
                     hovermode='closest',
                     margin=dict(b=20,l=5,r=5,t=40),
@@ -307,15 +483,13 @@ def create_plotly_visualization(G, followers, following):
     fig.write_html(f'visualizations/interactive_network_{today}.html')
     print(f"Interactive visualization saved as interactive_network_{today}.html")
 
-def create_summary_image():
+def create_summary_image(followers, following, partition):
     """Create a summary image with key metrics"""
+    from PIL import Image, ImageDraw, ImageFont
     today = datetime.now().strftime('%Y-%m-%d')
-    followers = get_github_user_list('followers')
-    following = get_github_user_list('following')
-    
-    mutual = set(followers) & set(following)
-    followers_only = set(followers) - mutual
-    following_only = set(following) - mutual
+    mutual = partition['mutual']
+    followers_only = partition['follower']
+    following_only = partition['following']
     
     # Create a summary image
     img = Image.new('RGB', (800, 600), color=(255, 255, 255))
@@ -368,30 +542,122 @@ def create_summary_image():
     img.save(f'visualizations/summary_{today}.png')
     print(f"Summary image saved as summary_{today}.png")
 
+def _run_stage(func, *args):
+    """Run one render stage and return its duration in seconds"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def run_render_stages(stages, workers=RENDER_WORKERS):
+    """
+    Run independent render stages, concurrently in a process pool if workers > 1
+    
+    Args:
+        stages (dict): Stage name -> (function, args)
+        workers (int): Number of worker processes
+        
+    Returns:
+        dict: Stage name -> duration in seconds
+    """
+    if workers <= 1:
+        return {name: _run_stage(func, *args) for name, (func, args) in stages.items()}
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(stages))) as executor:
+        futures = {name: executor.submit(_run_stage, func, *args) for name, (func, args) in stages.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def fetch_network():
+    """
+    Fetch followers and following concurrently
+    
+    Returns:
+        tuple: (followers, following) as lists in API order
+    """
+    snapshot = FollowSnapshot.fetch(lambda: get_github_user_list('followers'),
+                                    lambda: get_github_user_list('following'))
+    return list(snapshot.followers), list(snapshot.following)
+
+def snapshot_main():
+    """Fetch the lists and add them to the snapshot history, without rendering anything"""
+    os.makedirs('network_data', exist_ok=True)
+    followers, following = fetch_network()
+    print(f"Found {len(followers)} followers and {len(following)} following")
+    save_snapshot(followers, following)
+
+def report_main(since=None):
+    """
+    Print how the network changed between two days of the snapshot history
+    
+    Args:
+        since (str): Earlier day as YYYY-MM-DD, the snapshot before the latest one if not given
+    """
+    store = SnapshotStore(GITHUB_USERNAME)
+    days = store.days()
+    if len(days) < 2:
+        print("Not enough snapshot history for a report yet, run the snapshot stage on another day first")
+        return
+    since = datetime.strptime(since, '%Y-%m-%d').date() if since else days[-2]
+    changes = store.changes(since)
+    print(f"Changes for {GITHUB_USERNAME} from {since} to {days[-1]}:")
+    print(json.dumps({key: {"count": len(users), "users": users} for key, users in changes.items()}, indent=2))
+
 def main():
     """Main function to generate all visualizations"""
+    from compact_graph import CompactGraph
+    from network_layout import LayoutEngine
     print(f"Generating network visualization for {GITHUB_USERNAME}")
+    durations = {}
     
     # Make sure directories exist
     os.makedirs('network_data', exist_ok=True)
     os.makedirs('visualizations', exist_ok=True)
     
-    # Get followers and following
-    followers = get_github_user_list('followers')
-    following = get_github_user_list('following')
+    # Get followers and following once, every stage below works from these lists
+    start = time.perf_counter()
+    followers, following = fetch_network()
+    durations['fetch'] = time.perf_counter() - start
+    
+    # Continue the crawl of relationships beyond the account's own network
+    crawl_edges = None
+    if CRAWL_DEPTH > 0:
+        start = time.perf_counter()
+        crawl_edges = NetworkCrawler(get_client(), GITHUB_USERNAME).crawl(followers + following)
+        save_crawl_edges(crawl_edges)
+        durations['crawl'] = time.perf_counter() - start
     
     print(f"Found {len(followers)} followers and {len(following)} following")
     
     # Save raw data
-    save_data_to_csv(followers, following)
-    
-    # Generate graph
-    G = generate_network_graph(followers, following)
+    start = time.perf_counter()
+    save_snapshot(followers, following)
+    durations['snapshot'] = time.perf_counter() - start
+    
+    # Partition the network on the compact graph and generate the graph to render
+    start = time.perf_counter()
+    compact = CompactGraph.from_network(GITHUB_USERNAME, followers, following, crawl_edges)
+    # Ids follow API order, so the partition lists keep the order of the fetched lists
+    partition = {node_type: compact.logins(ids) for node_type, ids in compact.classify(0).items()}
+    G = generate_network_graph(followers, following, partition, crawl_edges)
+    durations['graph'] = time.perf_counter() - start
+    
+    # Lay the graph out once, both renderers draw the same positions
+    start = time.perf_counter()
+    pos = LayoutEngine(GITHUB_USERNAME).compute(G)
+    durations['layout'] = time.perf_counter() - start
+    
+    # Large graphs only label the most followed users
+    label_scores = None
+    if G.number_of_nodes() > MATPLOTLIB_DETAIL_MAX_NODES:
+        label_scores = label_scores_for(compact)
     
     # Create visualizations
-    create_matplotlib_visualization(G)
-    create_plotly_visualization(G, followers, following)
-    create_summary_image()
+    start = time.perf_counter()
+    durations.update(run_render_stages({
+        'matplotlib': (create_matplotlib_visualization, (G, pos, label_scores)),
+        'plotly': (create_plotly_visualization, (G, pos)),
+        'summary_image': (create_summary_image, (followers, following, partition))
+    }))
+    durations['render'] = time.perf_counter() - start
     
     # Create a metadata file with info about the graph
     metadata = {
@@ -399,13 +665,29 @@ def main():
         'username': GITHUB_USERNAME,
         'followers_count': len(followers),
         'following_count': len(following),
-        'mutual_count': len(set(followers) & set(following)),
-        'followers_only_count': len(set(followers) - set(following)),
-        'following_only_count': len(set(following) - set(followers)),
+        'mutual_count': len(partition['mutual']),
+        'followers_only_count': len(partition['follower']),
+        'following_only_count': len(partition['following']),
+        'graph_stats': compact.degree_stats(),
+        'stage_seconds': {stage: round(seconds, 3) for stage, seconds in durations.items()}
     }
     
+    # Hit rate and age of the profiles served, for tuning PROFILE_TTL_HOURS
+    if get_profile_cache.cache_info().currsize:
+        cache_stats = get_profile_cache().stats()
+        print(f"Profile cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"({cache_stats['hit_rate']:.0%}), {cache_stats['revalidated']} revalidated, "
+              f"served profiles {cache_stats['mean_age_hours']:.1f}h old on average, "
+              f"{cache_stats['max_age_hours']:.1f}h at most")
+        metadata['profile_cache'] = cache_stats
+        metrics.record_cache('profiles', cache_stats)
+    
     with open(f'network_data/metadata_{datetime.now().strftime("%Y-%m-%d")}.json', 'w') as f:
         json.dump(metadata, f, indent=2)
+    
+    for stage, seconds in durations.items():
+        metrics.add_stage(stage, seconds)
+    metrics.export('network_visualization')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,14 +1,47 @@
 import os
-import requests
 import json
+from events import ConsoleSink, EventBus, FollowEvent, JsonlSink, ReportAggregator
+from discord_dispatcher import DISCORD_FLUSH_TIMEOUT, MAX_EMBED_DESCRIPTION, DiscordDispatcher
+from github_api import HTTP_TIMEOUT, create_session
+from metrics import metrics
 
 DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
 
-# Track followed and unfollowed users
-followed_users = []
-unfollowed_users = []
-failed_follow_users = []
-failed_unfollow_users = []
+# Reports needing more embed messages than this are sent as a JSON file instead
+DISCORD_MAX_REPORT_MESSAGES = int(os.getenv('DISCORD_MAX_REPORT_MESSAGES', '3'))
+
+# Keep-alive session reused for all webhook posts
+discord_session = create_session(pool_size=2)
+
+# Background worker delivering webhook messages so callers never block on Discord
+dispatcher = DiscordDispatcher(DISCORD_WEBHOOK_URL, discord_session, timeout=HTTP_TIMEOUT)
+
+# Where every follow event is streamed as JSON lines, if set
+EVENT_LOG = os.getenv('EVENT_LOG')
+
+# Follow events flow through the bus to the console, the report and the optional event log
+event_bus = EventBus()
+event_bus.subscribe(ConsoleSink())
+report = event_bus.subscribe(ReportAggregator())
+if EVENT_LOG:
+    event_bus.subscribe(JsonlSink(EVENT_LOG))
+
+def publish_result(operation_type, user, success, account=None):
+    """
+    Publish the outcome of a follow/unfollow request
+    
+    Args:
+        operation_type (str): "follow" or "unfollow"
+        user (str): GitHub username
+        success (bool): Whether the request succeeded
+        account (str): Managed account that made the request, None for the configured one
+    """
+    event_bus.publish(FollowEvent(operation_type, user, success, account=account))
+
+def restore_result(operation_type, user, success, aggregator=None):
+    """Add an outcome recorded by an earlier run to a report without publishing it again"""
+    aggregator = aggregator or report
+    aggregator.handle(FollowEvent(operation_type, user, success, account=aggregator.account))
 
 def _extract_username(message, prefix):
     """Extract username from a message with a given prefix"""
@@ -18,25 +51,27 @@ def send_discord_notification(message):
     """
     Track GitHub users from notification messages
     
+    Kept for callers that still pass formatted messages, new code should
+    use publish_result instead.
+    
     Args:
         message (str): The notification message that contains action and username
     """
-    # Define message patterns and their corresponding lists
+    # Define message patterns and their corresponding outcomes
     message_patterns = {
-        "Followed ": followed_users,
-        "Unfollowed ": unfollowed_users,
-        "Failed to follow ": failed_follow_users,
-        "Failed to unfollow ": failed_unfollow_users
+        "Followed ": ("follow", True),
+        "Unfollowed ": ("unfollow", True),
+        "Failed to follow ": ("follow", False),
+        "Failed to unfollow ": ("unfollow", False)
     }
     
     # Process the message based on its prefix
-    for prefix, user_list in message_patterns.items():
+    for prefix, (operation_type, success) in message_patterns.items():
         if message.startswith(prefix):
-            username = _extract_username(message, prefix)
-            user_list.append(username)
-            break
+            publish_result(operation_type, _extract_username(message, prefix), success)
+            return
             
-    # Log the tracked message to console
+    # Log untracked messages to console
     print(f"Tracked: {message}")
 
 def send_message_to_user(username, subject, body):
@@ -45,77 +80,77 @@ def send_message_to_user(username, subject, body):
     print(message)
 
 
-def _create_user_category(users, label):
-    """Create a category object for the JSON report"""
-    return {
-        "count": len(users),
-        "users": users
-    }
-
-def _create_report():
-    """Create the JSON report of followed/unfollowed users"""
-    return {
-        "followed": _create_user_category(followed_users, "followed"),
-        "unfollowed": _create_user_category(unfollowed_users, "unfollowed"),
-        "failed_follows": _create_user_category(failed_follow_users, "failed_follows"),
-        "failed_unfollows": _create_user_category(failed_unfollow_users, "failed_unfollows")
-    }
+def _post_to_discord(content, embeds=None, files=None):
+    """Queue a message for the Discord webhook, delivery happens in the background"""
+    dispatcher.send(content, embeds, files)
 
-def _create_summary():
-    """Create a summary text of changes"""
-    categories = [
-        (followed_users, "Followed"),
-        (unfollowed_users, "Unfollowed"),
-        (failed_follow_users, "Failed to follow"),
-        (failed_unfollow_users, "Failed to unfollow")
-    ]
-    
-    summary = [f"{label}: {len(users)}" for users, label in categories if users]
-    return ", ".join(summary)
-
-def _post_to_discord(content, embeds=None):
-    """Send a message to Discord webhook"""
-    data = {"content": content}
-    if embeds:
-        data["embeds"] = embeds
-        
-    response = requests.post(DISCORD_WEBHOOK_URL, json=data)
-    
-    if response.status_code != 204:
-        print(f"Failed to send Discord report. Status code: {response.status_code}")
-        return False
-    else:
-        print("Discord report sent successfully")
-        return True
+def flush_notifications(timeout=DISCORD_FLUSH_TIMEOUT):
+    """Wait until queued Discord messages are delivered, so their delivery time is in the run's metrics"""
+    return dispatcher.flush(timeout)
 
-def _clear_user_lists():
-    """Clear all user tracking lists"""
-    followed_users.clear()
-    unfollowed_users.clear()
-    failed_follow_users.clear()
-    failed_unfollow_users.clear()
+def _split_report(report_text, limit=MAX_EMBED_DESCRIPTION - len("```json\n\n```")):
+    """Split the JSON report on line boundaries into chunks that fit an embed"""
+    chunks = []
+    current = ""
+    for line in report_text.splitlines():
+        # Lines longer than an embed are cut into pieces
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
 
 # Function to send a consolidated JSON report to Discord
-def send_follow_report():
-    """Send a JSON report of follow/unfollow activity to Discord"""
+def send_follow_report(aggregator=None):
+    """
+    Send a JSON report of follow/unfollow activity to Discord
+    
+    Args:
+        aggregator (ReportAggregator): Report of a managed account, the configured account's report if not given
+    """
+    aggregator = aggregator or report
     # Check if there are any changes to report
-    if not any([followed_users, unfollowed_users, failed_follow_users, failed_unfollow_users]):
+    if not aggregator.has_changes():
         _post_to_discord("No changes in followers/following today.")
         return
         
     # Create report and summary
-    report = _create_report()
-    summary_text = _create_summary()
+    summary_text = aggregator.create_summary()
     
     # Format the data for Discord
-    embeds = [{
-        "title": "GitHub Follow/Unfollow Report",
-        "description": f"```json\n{json.dumps(report, indent=2)}\n```"
-    }]
+    report_text = json.dumps(aggregator.create_report(), indent=2)
+    content = f"Github({aggregator.account or 'prabinpanta0'}) Report: {summary_text}"
+    chunks = _split_report(report_text)
+    # API usage of this account and stage timings of the run so far, shown under the report
+    run_stats = metrics.condensed(aggregator.account)
     
-    # Send the notification
-    if _post_to_discord(f"Github(prabinpanta0) Report: {summary_text}", embeds):
-        _clear_user_lists()
+    # Send the notification, as a file attachment when it would take too many messages
+    if len(chunks) > DISCORD_MAX_REPORT_MESSAGES:
+        _post_to_discord(f"{content}\n{run_stats}" if run_stats else content,
+                         files={"report.json": report_text.encode()})
+    else:
+        for i, chunk in enumerate(chunks, 1):
+            title = "GitHub Follow/Unfollow Report"
+            if len(chunks) > 1:
+                title += f" ({i}/{len(chunks)})"
+            embed = {"title": title, "description": f"```json\n{chunk}\n```"}
+            if i == len(chunks) and run_stats:
+                embed["footer"] = {"text": run_stats}
+            _post_to_discord(content if i == 1 else "", [embed])
+    aggregator.clear()
+
+def send_account_failure(username, error):
+    """Tell the Discord channel that the run of a managed account failed"""
+    print(f"Run for {username} failed: {error}")
+    _post_to_discord(f"Github({username}): run failed, the other accounts kept going. Error: {error}")
 
 # Added notifications for no one to follow/unfollow
 def no_one_to_follow():
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from events import ReportAggregator
+from follow_unfollow import Account, _out_of_time, follow_user, get_followers, get_following, record_result, unfollow_user
+from incremental_sync import INCREMENTAL_SYNC
+from journal import RUN_TIME_BUDGET, RunJournal
+from metrics import metrics
+from notifications import event_bus, flush_notifications, no_one_to_follow, no_one_to_unfollow, restore_result, send_account_failure, send_follow_report
+from snapshot import FollowSnapshot
+
+# JSON list of managed accounts, each {"username": ..., "token_env": name of the variable holding its token}
+ACCOUNTS_FILE = os.getenv('ACCOUNTS_FILE', 'accounts.json')
+# Follow/unfollow requests in flight across all accounts
+ORCHESTRATOR_WORKERS = int(os.getenv('ORCHESTRATOR_WORKERS', '8'))
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """
+    Read the managed accounts from a JSON file
+    
+    Args:
+        path (str): Path of the accounts file
+        
+    Returns:
+        list: Account objects, accounts whose token variable is not set are skipped
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    accounts = []
+    for entry in entries:
+        token = os.getenv(entry['token_env'])
+        if not token:
+            print(f"Skipping {entry['username']}: {entry['token_env']} is not set")
+            continue
+        accounts.append(Account(entry['username'], token))
+    return accounts
+
+class AccountRun:
+    """
+    Follow/unfollow work of one account in an orchestrated run
+    
+    Each account keeps its own journal and report, so an interrupted run
+    resumes per account and every account gets its own Discord report. An
+    error in one account, such as an expired token, stops only that
+    account.
+    """
+    
+    def __init__(self, account):
+        self.account = account
+        self.report = event_bus.subscribe(ReportAggregator(account=account.username))
+        self.journal = RunJournal(account.username)
+        self.snapshot = None
+        # (operation_type, user) pairs not dispatched yet, follows first
+        self.pending = deque()
+        self.in_flight = 0
+        self.dispatched = 0
+        self.error = None
+    
+    def prepare(self):
+        """Plan the run from a fresh snapshot, or resume it from the journal"""
+        journal = self.journal
+        if journal.resumable:
+            print(f'{self.account.username}: resuming an interrupted run from its journal.')
+            for operation_type in journal.plans:
+                if operation_type not in journal.reported:
+                    for _, user, success in journal.results(operation_type):
+                        restore_result(operation_type, user, success, self.report)
+        else:
+            self.snapshot = FollowSnapshot.fetch(lambda: get_followers(self.account),
+                                                 lambda: get_following(self.account))
+            to_follow, to_unfollow = self.snapshot.diff()
+            journal.plan("follow", to_follow)
+            journal.plan("unfollow", to_unfollow)
+        for operation_type in ("follow", "unfollow"):
+            if operation_type not in journal.reported:
+                self.pending.extend((operation_type, user) for user in journal.remaining(operation_type))
+        print(f'{self.account.username}: {len(self.pending)} users to process')
+    
+    def fail(self, error):
+        """Stop the account after an error, leaving its journal for the next run to resume"""
+        self.error = error
+        self.pending.clear()
+        send_account_failure(self.account.username, error)
+        self.journal.close()
+        event_bus.unsubscribe(self.report)
+    
+    @property
+    def idle(self):
+        """True once nothing is pending or in flight"""
+        return not self.pending and not self.in_flight
+    
+    def finish(self):
+        """Send the account's report and close its journal"""
+        journal = self.journal
+        if self.pending:
+            print(f'{self.account.username}: run time budget used up, the remaining users are left for the next run.')
+            journal.close()
+            return
+        for operation_type, notify_func in (("follow", no_one_to_follow), ("unfollow", no_one_to_unfollow)):
+            if not journal.plans.get(operation_type):
+                notify_func()
+        if not set(journal.plans) <= journal.reported:
+            send_follow_report(self.report)
+            for operation_type in journal.plans:
+                if operation_type not in journal.reported:
+                    journal.mark_reported(operation_type)
+        # Keep the stored following list in step with this run's mutations
+        if INCREMENTAL_SYNC:
+            results = journal.results()
+            self.account.delta_sync.record_mutations(
+                [user for operation, user, success in results if operation == "follow" and success],
+                [user for operation, user, success in results if operation == "unfollow" and success])
+        journal.complete()
+        event_bus.unsubscribe(self.report)
+
+def _finish(run):
+    """Finish an account's run, a failure there does not affect the other accounts"""
+    try:
+        run.finish()
+    except Exception as e:
+        run.fail(e)
+
+def _operate(run, operation_type, user):
+    """Run one follow/unfollow request of an account in a worker thread"""
+    operation_func = follow_user if operation_type == "follow" else unfollow_user
+    return operation_func(user, account=run.account)
+
+def run_accounts(runs, workers=ORCHESTRATOR_WORKERS, deadline=None):
+    """
+    Process the pending users of several accounts on one shared worker pool
+    
+    Accounts are served round-robin, one user at a time, and no account
+    may hold more than its fair share of the workers (the pool size split
+    over the accounts that still have work). Every account paces its
+    requests with its own rate-limit scheduler, so a token that runs out
+    of quota only stalls its own share of the pool while the other
+    accounts keep going. Results are handled on the calling thread, and a
+    request that raises counts as failed for its user only.
+    
+    Args:
+        runs (list): AccountRun objects, already prepared
+        workers (int): Requests in flight across all accounts
+        deadline (float): time.monotonic() value after which no new user is started
+    """
+    workers = max(1, workers)
+    rotation = deque(run for run in runs if run.pending)
+    in_flight = {}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            if not _out_of_time(deadline):
+                share = max(1, workers // max(1, len(rotation)))
+                # Hand out one user per account per pass until the pool or every share is full
+                dispatched = True
+                while dispatched and len(in_flight) < workers:
+                    dispatched = False
+                    for _ in range(len(rotation)):
+                        run = rotation[0]
+                        rotation.rotate(-1)
+                        if not run.pending or run.in_flight >= share or len(in_flight) >= workers:
+                            continue
+                        operation_type, user = run.pending.popleft()
+                        run.in_flight += 1
+                        run.dispatched += 1
+                        future = executor.submit(_operate, run, operation_type, user)
+                        in_flight[future] = (run, operation_type, user, run.dispatched)
+                        dispatched = True
+            if not in_flight:
+                break
+            
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                run, operation_type, user, index = in_flight.pop(future)
+                run.in_flight -= 1
+                try:
+                    success = future.result()
+                except Exception as e:
+                    print(f'{run.account.username}: {operation_type} {user} raised {e!r}')
+                    success = False
+                record_result(index, user, operation_type, success, run.snapshot, run.journal, run.account)
+                if run.idle:
+                    rotation.remove(run)
+                    print(f'\nFinished processing {run.account.username}.')
+                    _finish(run)
+    
+    # Accounts stopped by the deadline, or that had nothing to do
+    for run in runs:
+        if run in rotation or not run.dispatched:
+            _finish(run)
+
+def main():
+    """Run the follow and unfollow operations for every account in ACCOUNTS_FILE"""
+    accounts = load_accounts()
+    if not accounts:
+        print(f'No accounts to process in {ACCOUNTS_FILE}')
+        return
+    deadline = time.monotonic() + RUN_TIME_BUDGET if RUN_TIME_BUDGET else None
+    
+    # Fetch the lists of all accounts concurrently, an account that fails is left out
+    runs = [AccountRun(account) for account in accounts]
+    try:
+        with metrics.stage('fetch'), ThreadPoolExecutor(max_workers=len(runs)) as executor:
+            futures = [(run, executor.submit(run.prepare)) for run in runs]
+            for run, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    run.fail(e)
+        
+        with metrics.stage('mutate'):
+            run_accounts([run for run in runs if run.error is None], deadline=deadline)
+    finally:
+        flush_notifications()
+        metrics.export('orchestrator')
+
+if __name__ == "__main__":
+    main()
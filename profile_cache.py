@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http_cache import CACHE_DIR
+
+# Hours a cached profile is served without asking GitHub
+PROFILE_TTL_HOURS = float(os.getenv('PROFILE_TTL_HOURS', '24'))
+# Maximum number of profiles kept before the least recently used are evicted
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv('PROFILE_CACHE_MAX_ENTRIES', '50000'))
+# Number of profiles fetched concurrently on a cache miss
+PROFILE_FETCH_WORKERS = int(os.getenv('PROFILE_FETCH_WORKERS', '8'))
+
+class ProfileCache:
+    """
+    SQLite store of GitHub user profiles keyed by login
+
+    Every record carries its own expiry time, spread by a small random
+    jitter so profiles cached on the same day do not all expire together.
+    Expired records keep their ETag and are revalidated with a conditional
+    request instead of being downloaded again. The connection may be used
+    from any thread, a lock serialises access to it.
+    """
+
+    def __init__(self, path=None, ttl_hours=PROFILE_TTL_HOURS, max_entries=PROFILE_CACHE_MAX_ENTRIES):
+        self.path = path or os.path.join(CACHE_DIR, 'profiles.sqlite')
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.refreshed = 0
+        self._served_ages = []
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                login TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                etag TEXT,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS profiles_last_access ON profiles (last_access)")
+        self._conn.commit()
+
+    def _expiry(self, now):
+        """Expiry time for a record stored now, with +/-10% jitter"""
+        return now + self.ttl * random.uniform(0.9, 1.1)
+
+    def lookup(self, usernames):
+        """
+        Split usernames into fresh, stale and missing records
+
+        Args:
+            usernames (list): Logins to look up
+
+        Returns:
+            tuple: (dict login -> profile for fresh records,
+                    dict login -> (profile, etag) for expired records,
+                    list of logins not in the cache)
+        """
+        now = time.time()
+        fresh, stale, found = {}, {}, set()
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look up in chunks
+            for start in range(0, len(usernames), 500):
+                chunk = usernames[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT login, data, etag, fetched_at, expires_at FROM profiles "
+                    f"WHERE login IN ({','.join('?' * len(chunk))})", chunk)
+                for login, data, etag, fetched_at, expires_at in rows:
+                    found.add(login)
+                    if expires_at > now:
+                        fresh[login] = json.loads(data)
+                        self._served_ages.append(now - fetched_at)
+                    else:
+                        stale[login] = (json.loads(data), etag)
+            self._conn.executemany("UPDATE profiles SET last_access = ? WHERE login = ?",
+                                   [(now, login) for login in found])
+            self._conn.commit()
+            self.hits += len(fresh)
+            self.misses += len(usernames) - len(fresh)
+        return fresh, stale, [login for login in usernames if login not in found]
+
+    def peek(self, usernames):
+        """
+        Read cached profiles, expired ones included, without counting it as use
+
+        Unlike lookup() this leaves the hit/miss statistics and the last
+        access times alone, so ranking or reporting over many users does
+        not skew the hit rate or the eviction order.
+
+        Args:
+            usernames (list): Logins to read
+
+        Returns:
+            dict: login -> profile for every login in the cache
+        """
+        profiles = {}
+        with self._lock:
+            for start in range(0, len(usernames), 500):
+                chunk = usernames[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT login, data FROM profiles WHERE login IN ({','.join('?' * len(chunk))})", chunk)
+                profiles.update((login, json.loads(data)) for login, data in rows)
+        return profiles
+
+    def put_many(self, profiles, etags=None):
+        """
+        Store fetched profiles and evict the least recently used if over capacity
+
+        Args:
+            profiles (dict): login -> profile
+            etags (dict): Optional login -> ETag of the response
+        """
+        now = time.time()
+        etags = etags or {}
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO profiles (login, data, etag, fetched_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(login, json.dumps(profile), etags.get(login), now, self._expiry(now), now)
+                 for login, profile in profiles.items()])
+            self._evict()
+            self._conn.commit()
+
+    def touch_many(self, usernames):
+        """Extend the expiry of records revalidated with a 304 response"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE profiles SET fetched_at = ?, expires_at = ?, last_access = ? WHERE login = ?",
+                [(now, self._expiry(now), now, login) for login in usernames])
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete the least recently used records beyond max_entries, called with the lock held"""
+        count = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM profiles WHERE login IN "
+                "(SELECT login FROM profiles ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,))
+
+    def get_profiles(self, usernames, fetch_one=None, fetch_many=None, workers=PROFILE_FETCH_WORKERS):
+        """
+        Return profiles for many users, fetching only what the cache cannot serve
+
+        Misses are filled either in bulk by fetch_many, or concurrently by
+        fetch_one with ETag revalidation of expired records. If fetch_one
+        raises for a user, their expired record is served when there is one.
+
+        Args:
+            usernames (list): Logins to look up
+            fetch_one (callable): fetch_one(login, etag) returning (profile, etag);
+                profile is None when GitHub answered 304 Not Modified
+            fetch_many (callable): fetch_many(logins) returning a dict login -> profile
+            workers (int): Maximum number of concurrent fetch_one calls
+
+        Returns:
+            dict: login -> profile for every login that could be served
+        """
+        usernames = list(dict.fromkeys(usernames))
+        profiles, stale, missing = self.lookup(usernames)
+        to_fetch = missing + list(stale)
+        if not to_fetch:
+            return profiles
+
+        if fetch_many is not None:
+            fetched = fetch_many(to_fetch)
+            self.put_many(fetched)
+            self.refreshed += len(fetched)
+            profiles.update(fetched)
+            return profiles
+
+        def fetch(login):
+            try:
+                return fetch_one(login, stale.get(login, (None, None))[1])
+            except Exception as e:
+                print(f"Error fetching data for {login}: {e}")
+                return None
+
+        fetched, etags, not_modified = {}, {}, []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(to_fetch)))) as executor:
+            for login, result in zip(to_fetch, executor.map(fetch, to_fetch)):
+                if result is None:
+                    if login in stale:
+                        profiles[login] = stale[login][0]
+                    continue
+                profile, etag = result
+                if profile is None:
+                    not_modified.append(login)
+                    profiles[login] = stale[login][0]
+                else:
+                    fetched[login] = profile
+                    etags[login] = etag
+                    profiles[login] = profile
+
+        self.put_many(fetched, etags)
+        self.touch_many(not_modified)
+        self.revalidated += len(not_modified)
+        self.refreshed += len(fetched)
+        return profiles
+
+    def stats(self):
+        """
+        Return cache effectiveness and staleness metrics for this run
+
+        Returns:
+            dict: Hit/miss counts, hit rate, revalidations, and the mean and
+            maximum age in hours of profiles served from the cache
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            ages = list(self._served_ages)
+            entries = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'revalidated': self.revalidated,
+            'refreshed': self.refreshed,
+            'entries': entries,
+            'mean_age_hours': sum(ages) / len(ages) / 3600 if ages else 0.0,
+            'max_age_hours': max(ages) / 3600 if ages else 0.0
+        }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
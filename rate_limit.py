@@ -0,0 +1,173 @@
+import os
+import time
+import random
+import threading
+from metrics import metrics
+
+# Sustained mutations per second when the API has not asked us to slow down
+MUTATION_RATE = float(os.getenv('MUTATION_RATE', '1.0'))
+# Number of mutations that may be sent back to back before pacing kicks in
+MUTATION_BURST = float(os.getenv('MUTATION_BURST', '5'))
+# Upper bound for a single backoff in seconds
+MAX_BACKOFF = float(os.getenv('MAX_BACKOFF', '900'))
+
+PRIMARY_LIMIT = 'primary'
+SECONDARY_LIMIT = 'secondary'
+SERVER_ERROR = 'server_error'
+# No response at all, e.g. a connection error or timeout
+REQUEST_ERROR = 'request_error'
+
+class RateLimitScheduler:
+    """
+    Central pacing for GitHub API requests
+
+    Mutations draw from a token bucket whose refill rate adapts to the
+    responses: it is halved whenever a secondary rate limit is hit and grows
+    back slowly after consecutive successes. It is also capped so the
+    remaining primary quota lasts until the reset time. Backoff only happens
+    when a response actually signals a limit or a server error.
+    """
+
+    def __init__(self, rate=MUTATION_RATE, burst=MUTATION_BURST, max_backoff=MAX_BACKOFF):
+        self.max_rate = rate
+        self.min_rate = rate / 32
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.max_backoff = max_backoff
+        self.remaining = None
+        self.reset_at = None
+        self._successes = 0
+        self._paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _effective_rate(self):
+        """Current refill rate, capped so the primary quota lasts until reset"""
+        rate = self.rate
+        if self.remaining is not None and self.reset_at is not None:
+            seconds_left = max(1.0, self.reset_at - time.time())
+            rate = min(rate, max(self.remaining, 1) / seconds_left)
+        return rate
+
+    def _refill(self, now):
+        """Add the tokens accumulated since the last refill"""
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self._effective_rate())
+
+    def acquire(self):
+        """Block until the next request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self._effective_rate()
+            time.sleep(wait)
+
+    def observe(self, response):
+        """
+        Record the rate-limit headers of a response
+
+        Args:
+            response (requests.Response): Any GitHub API response
+        """
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        with self._lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = int(reset)
+
+    def record_success(self):
+        """Grow the mutation rate back towards its maximum after a run of successes"""
+        with self._lock:
+            self._successes += 1
+            if self._successes >= 20 and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate * 1.5)
+                self._successes = 0
+
+    def classify(self, response):
+        """
+        Tell which kind of limit a failed response signals
+
+        Args:
+            response (requests.Response): Failed GitHub API response
+
+        Returns:
+            str: PRIMARY_LIMIT, SECONDARY_LIMIT, SERVER_ERROR, or None if the
+            failure should not be retried
+        """
+        if response.status_code >= 500:
+            return SERVER_ERROR
+        if response.status_code not in (403, 429):
+            return None
+        if response.headers.get('Retry-After') is not None:
+            return SECONDARY_LIMIT
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            return PRIMARY_LIMIT
+        if 'secondary rate limit' in response.text.lower() or 'abuse' in response.text.lower():
+            return SECONDARY_LIMIT
+        if response.status_code == 429:
+            return SECONDARY_LIMIT
+        # A plain 403 is a permission problem, waiting will not fix it
+        return None
+
+    def backoff(self, response, attempt):
+        """
+        Pause all requests as long as the failed response asks for
+
+        Args:
+            response (requests.Response): Failed GitHub API response
+            attempt (int): Zero-based retry attempt for this request
+
+        Returns:
+            tuple: (kind of limit, seconds paused), or (None, 0) if the request
+            should not be retried
+        """
+        kind = self.classify(response)
+        if kind is None:
+            return None, 0
+
+        if kind == PRIMARY_LIMIT:
+            reset = response.headers.get('X-RateLimit-Reset')
+            delay = int(reset) - time.time() + 1 if reset else 60
+        elif kind == SECONDARY_LIMIT:
+            retry_after = response.headers.get('Retry-After')
+            delay = float(retry_after) if retry_after else 60 * 2 ** attempt
+        else:
+            delay = 2 ** attempt
+        if kind == SECONDARY_LIMIT:
+            with self._lock:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._successes = 0
+        return kind, self.pause(delay, kind)
+
+    def pause(self, delay, kind=REQUEST_ERROR):
+        """
+        Pause all requests for about delay seconds
+
+        Args:
+            delay (float): Seconds to pause, capped at max_backoff before jitter is added
+            kind (str): Cause recorded in the metrics
+
+        Returns:
+            float: Seconds actually paused
+        """
+        delay = min(max(delay, 0), self.max_backoff)
+        # Jitter keeps concurrent workers from retrying in lockstep
+        delay += random.uniform(0, 1 + delay * 0.1)
+        metrics.observe_backoff(kind, delay)
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            # Start refilling only once the pause is over, so it does not end in a burst
+            self._updated = self._paused_until
+            self.tokens = 0
+        return delay
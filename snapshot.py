@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class FollowSnapshot:
+    """
+    Followers and following of one account, fetched once per run
+
+    Both lists are kept as insertion-ordered dicts, which gives set-like
+    lookups while preserving the order GitHub returned them in. Successful
+    mutations are recorded so later phases see the updated state without
+    fetching the lists again.
+    """
+
+    def __init__(self, followers, following):
+        self.followers = dict.fromkeys(followers)
+        self.following = dict.fromkeys(following)
+        self.followed = []
+        self.unfollowed = []
+
+    @classmethod
+    def fetch(cls, get_followers, get_following):
+        """
+        Fetch both lists concurrently and build a snapshot from them
+
+        Args:
+            get_followers (callable): Returns the list of followers
+            get_following (callable): Returns the list of followed users
+
+        Returns:
+            FollowSnapshot: Snapshot of the current state
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            followers = executor.submit(get_followers)
+            following = executor.submit(get_following)
+            return cls(followers.result(), following.result())
+
+    def diff(self):
+        """
+        Compute the users to follow back and to unfollow
+
+        Returns:
+            tuple: (users to follow, users to unfollow) as lists
+        """
+        to_follow = [user for user in self.followers if user not in self.following]
+        to_unfollow = [user for user in self.following if user not in self.followers]
+        return to_follow, to_unfollow
+
+    def record(self, operation_type, user):
+        """Update the snapshot after a successful follow or unfollow"""
+        if operation_type == "follow":
+            self.following[user] = None
+            self.followed.append(user)
+        else:
+            self.following.pop(user, None)
+            self.unfollowed.append(user)
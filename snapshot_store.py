@@ -0,0 +1,284 @@
+import os
+import re
+import sys
+import zlib
+import struct
+from array import array
+from itertools import accumulate
+from datetime import date
+
+# Number of daily snapshots between full checkpoints, the days in between are stored as deltas
+SNAPSHOT_CHECKPOINT_EVERY = int(os.getenv('SNAPSHOT_CHECKPOINT_EVERY', '30'))
+
+# Record header: day ordinal, record kind, payload length
+_HEADER = struct.Struct('<IBI')
+_CHECKPOINT = 0
+_DELTA = 1
+
+def _encode_ids(ids):
+    """Encode a set of ids as a count followed by the gaps between the sorted ids"""
+    gaps = array('I')
+    previous = 0
+    for value in sorted(ids):
+        gaps.append(value - previous)
+        previous = value
+    if sys.byteorder == 'big':
+        gaps.byteswap()
+    return struct.pack('<I', len(gaps)) + gaps.tobytes()
+
+def _decode_ids(payload, offset):
+    """Decode a set of ids written by _encode_ids, returning it with the offset after it"""
+    (count,) = struct.unpack_from('<I', payload, offset)
+    offset += 4
+    gaps = array('I')
+    gaps.frombytes(payload[offset:offset + 4 * count])
+    if sys.byteorder == 'big':
+        gaps.byteswap()
+    return set(accumulate(gaps)), offset + 4 * count
+
+class LoginTable:
+    """
+    Append-only table interning GitHub logins as small integer ids
+
+    The id of a login is its line number in the table file, so every login
+    is stored once however many snapshots refer to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ids = {}
+        self._logins = []
+        self._pending = []
+        try:
+            with open(path) as f:
+                for line in f:
+                    self._add(line.rstrip('\n'))
+        except OSError:
+            pass
+
+    def _add(self, login):
+        self._ids[login] = len(self._logins)
+        self._logins.append(login)
+
+    def __len__(self):
+        return len(self._logins)
+
+    def intern(self, logins):
+        """Return the ids of logins, assigning new ids to unseen ones"""
+        ids = []
+        for login in logins:
+            if login not in self._ids:
+                self._add(login)
+                self._pending.append(login)
+            ids.append(self._ids[login])
+        return ids
+
+    def logins(self, ids):
+        """Return the logins of ids"""
+        return [self._logins[i] for i in ids]
+
+    def flush(self):
+        """Append newly interned logins to the table file"""
+        if not self._pending:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(''.join(f'{login}\n' for login in self._pending))
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending = []
+
+class SnapshotStore:
+    """
+    Compact daily history of an account's followers and following
+
+    Logins are interned in a LoginTable. Each day is one binary record with
+    the ids added to and removed from both lists since the previous day,
+    and every checkpoint_every days a full checkpoint is written instead,
+    so materializing a day never replays more than that many deltas. Id
+    sets are stored sorted and gap-encoded, then zlib-compressed.
+    Saving the same day twice replaces that day's record.
+    """
+
+    def __init__(self, username, directory='network_data', checkpoint_every=SNAPSHOT_CHECKPOINT_EVERY):
+        self.path = os.path.join(directory, f'snapshots_{username}.bin')
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.logins = LoginTable(os.path.join(directory, 'logins.txt'))
+        # (day ordinal, kind, offset, length) of every record in file order
+        self._index = []
+        self._cached = None
+        self._scan()
+
+    def _scan(self):
+        """Index the records of the snapshot file, dropping a torn last record"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset + _HEADER.size <= size:
+                f.seek(offset)
+                day, kind, length = _HEADER.unpack(f.read(_HEADER.size))
+                if offset + _HEADER.size + length > size:
+                    break
+                self._index.append((day, kind, offset, length))
+                offset += _HEADER.size + length
+        if offset != size:
+            # A record cut short by a killed run, everything before it is valid
+            os.truncate(self.path, offset)
+
+    def days(self):
+        """Dates with a stored snapshot, oldest first"""
+        return [date.fromordinal(day) for day, _, _, _ in self._index]
+
+    def _read(self, entry):
+        """Read and decode the id sets of one record"""
+        _, kind, offset, length = entry
+        with open(self.path, 'rb') as f:
+            f.seek(offset + _HEADER.size)
+            payload = zlib.decompress(f.read(length))
+        sets = []
+        position = 0
+        for _ in range(2 if kind == _CHECKPOINT else 4):
+            ids, position = _decode_ids(payload, position)
+            sets.append(ids)
+        return sets
+
+    def _materialize_ids(self, position):
+        """Follower and following id sets as of the record at an index position"""
+        if self._cached is not None and self._cached[0] == position:
+            followers, following = self._cached[1]
+            return set(followers), set(following)
+
+        start = position
+        while self._index[start][1] != _CHECKPOINT:
+            start -= 1
+        followers, following = self._read(self._index[start])
+        for entry in self._index[start + 1:position + 1]:
+            added_followers, removed_followers, added_following, removed_following = self._read(entry)
+            followers = (followers - removed_followers) | added_followers
+            following = (following - removed_following) | added_following
+
+        self._cached = (position, (frozenset(followers), frozenset(following)))
+        return followers, following
+
+    def _position(self, day):
+        """Index position of the latest record on or before a day, or None"""
+        ordinal = day.toordinal()
+        for position in range(len(self._index) - 1, -1, -1):
+            if self._index[position][0] <= ordinal:
+                return position
+        return None
+
+    def load(self, day=None):
+        """
+        Materialize the followers and following of a day
+
+        Args:
+            day (date): Day to load, the latest snapshot if not given; a day
+                without a record returns the latest snapshot before it
+
+        Returns:
+            tuple: (set of followers, set of following)
+
+        Raises:
+            KeyError: If no snapshot exists on or before the day
+        """
+        position = len(self._index) - 1 if day is None else self._position(day)
+        if position is None or position < 0:
+            raise KeyError(f'No snapshot on or before {day}')
+        followers, following = self._materialize_ids(position)
+        return set(self.logins.logins(followers)), set(self.logins.logins(following))
+
+    def changes(self, since, until=None):
+        """
+        Compare two days of the history
+
+        Args:
+            since (date): Earlier day
+            until (date): Later day, the latest snapshot if not given
+
+        Returns:
+            dict: Sorted logins under new_followers, lost_followers, followed and unfollowed
+        """
+        old_followers, old_following = self.load(since)
+        new_followers, new_following = self.load(until)
+        return {
+            'new_followers': sorted(new_followers - old_followers),
+            'lost_followers': sorted(old_followers - new_followers),
+            'followed': sorted(new_following - old_following),
+            'unfollowed': sorted(old_following - new_following)
+        }
+
+    def save(self, followers, following, day=None):
+        """
+        Store the followers and following of a day
+
+        Args:
+            followers (list): Logins following the account
+            following (list): Logins the account follows
+            day (date): Day of the snapshot, today if not given
+        """
+        ordinal = (day or date.today()).toordinal()
+        if self._index and self._index[-1][0] > ordinal:
+            raise ValueError(f'Snapshots must be saved in date order, {self.days()[-1]} is already stored')
+        if self._index and self._index[-1][0] == ordinal:
+            # Replace a snapshot saved earlier on the same day
+            os.truncate(self.path, self._index.pop()[2])
+            self._cached = None
+
+        followers = set(self.logins.intern(followers))
+        following = set(self.logins.intern(following))
+        self.logins.flush()
+
+        since_checkpoint = 0
+        for _, kind, _, _ in reversed(self._index):
+            if kind == _CHECKPOINT:
+                break
+            since_checkpoint += 1
+
+        if not self._index or since_checkpoint + 1 >= self.checkpoint_every:
+            kind = _CHECKPOINT
+            sections = [followers, following]
+        else:
+            kind = _DELTA
+            old_followers, old_following = self._materialize_ids(len(self._index) - 1)
+            sections = [followers - old_followers, old_followers - followers,
+                        following - old_following, old_following - following]
+
+        payload = zlib.compress(b''.join(_encode_ids(ids) for ids in sections))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(_HEADER.pack(ordinal, kind, len(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._index.append((ordinal, kind, offset, len(payload)))
+        self._cached = (len(self._index) - 1, (frozenset(followers), frozenset(following)))
+
+    def import_csv(self, directory):
+        """
+        Import the daily followers_/following_ CSV files written by earlier versions
+
+        Days already covered by the store are skipped.
+
+        Returns:
+            int: Number of days imported
+        """
+        pattern = re.compile(r'^followers_(\d{4}-\d{2}-\d{2})\.csv$')
+        days = sorted(match.group(1) for match in map(pattern.match, os.listdir(directory)) if match)
+        last = self._index[-1][0] if self._index else 0
+        imported = 0
+        for day in days:
+            following_path = os.path.join(directory, f'following_{day}.csv')
+            if date.fromisoformat(day).toordinal() <= last or not os.path.exists(following_path):
+                continue
+            lists = []
+            for path in (os.path.join(directory, f'followers_{day}.csv'), following_path):
+                with open(path) as f:
+                    lists.append([line.strip() for line in f.readlines()[1:] if line.strip()])
+            self.save(lists[0], lists[1], date.fromisoformat(day))
+            imported += 1
+        return imported
@@ -0,0 +1,203 @@
+import os
+import heapq
+import queue
+import shutil
+import tempfile
+import threading
+from bisect import bisect_right
+from http_cache import CACHE_DIR
+
+# Stream the follower/following diff through sorted on-disk runs instead of in-memory sets
+STREAMING_DIFF = os.getenv('STREAMING_DIFF', '').lower() in ('1', 'true', 'yes')
+# Logins held in memory before they are sorted and spilled to a run file
+STREAM_RUN_SIZE = int(os.getenv('STREAM_RUN_SIZE', '100000'))
+# Every n-th login of a merged file is kept in the in-memory sparse index
+SPARSE_INDEX_EVERY = 64
+
+# Marks the end of the stream in the candidate queue
+_DONE = object()
+
+class ExternalSorter:
+    """
+    Sort and deduplicate a stream of logins with bounded memory
+
+    Logins are buffered up to run_size, then sorted and written to a run
+    file. merge() combines the runs with a k-way merge into one sorted file.
+    """
+
+    def __init__(self, directory, name, run_size=STREAM_RUN_SIZE):
+        self.directory = directory
+        self.name = name
+        self.run_size = run_size
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def add(self, logins):
+        """Add logins to the stream"""
+        self._buffer.extend(logins)
+        self.count += len(logins)
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        """Write the buffer as a sorted run"""
+        if not self._buffer:
+            return
+        path = os.path.join(self.directory, f'{self.name}.run{len(self._runs)}')
+        with open(path, 'w', newline='\n') as f:
+            f.writelines(f'{login}\n' for login in sorted(set(self._buffer)))
+        self._runs.append(path)
+        self._buffer = []
+
+    def merge(self):
+        """
+        Merge all runs into one sorted, deduplicated file
+
+        Returns:
+            SortedLogins: The merged file
+        """
+        self._spill()
+        path = os.path.join(self.directory, f'{self.name}.sorted')
+        files = [open(run) for run in self._runs]
+        try:
+            with open(path, 'w', newline='\n') as out:
+                previous = None
+                for line in heapq.merge(*files):
+                    if line != previous:
+                        out.write(line)
+                        previous = line
+        finally:
+            for f in files:
+                f.close()
+        for run in self._runs:
+            os.remove(run)
+        self._runs = []
+        return SortedLogins(path)
+
+class SortedLogins:
+    """
+    Sorted login file with a sparse in-memory index for membership tests
+
+    Only every SPARSE_INDEX_EVERY-th login is held in memory together with
+    its file offset, a lookup reads at most one block from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._keys = []
+        self._offsets = []
+        self._file = open(path, 'rb')
+        offset = 0
+        for i, line in enumerate(self._file):
+            if i % SPARSE_INDEX_EVERY == 0:
+                self._keys.append(line[:-1].decode())
+                self._offsets.append(offset)
+            offset += len(line)
+
+    def __contains__(self, login):
+        block = bisect_right(self._keys, login) - 1
+        if block < 0:
+            return False
+        target = login.encode()
+        self._file.seek(self._offsets[block])
+        for _ in range(SPARSE_INDEX_EVERY):
+            line = self._file.readline()[:-1]
+            if line == target:
+                return True
+            if not line or line > target:
+                return False
+        return False
+
+    def __iter__(self):
+        with open(self.path) as f:
+            for line in f:
+                yield line[:-1]
+
+    def close(self):
+        self._file.close()
+
+def only_in(left, right):
+    """Merge-join two sorted login iterables, yielding logins only found in the left one"""
+    right = iter(right)
+    current = next(right, None)
+    for login in left:
+        while current is not None and current < login:
+            current = next(right, None)
+        if current != login:
+            yield login
+
+class StreamingDiff:
+    """
+    Follow/unfollow diff of lists too large to hold in memory
+
+    The following list is fetched first and spilled to sorted runs, which
+    are merged into one indexed file. The followers are then streamed: a
+    background thread fetches their pages and hands every follower missing
+    from the following file to follow_candidates() right away, so follow
+    mutations start before the fetch finishes. Following a user does not
+    change the followers list being paged through. Once the followers are
+    spilled and merged too, unfollow_candidates() merge-joins both files.
+    """
+
+    def __init__(self, iter_pages, directory=None, run_size=STREAM_RUN_SIZE):
+        self.iter_pages = iter_pages
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.directory = directory or tempfile.mkdtemp(prefix='diff_', dir=CACHE_DIR)
+        self.run_size = run_size
+        self.following = None
+        self.followers = None
+        self._candidates = queue.Queue(maxsize=1000)
+        self._error = None
+
+    def _fetch_sorted(self, endpoint, on_page=None):
+        sorter = ExternalSorter(self.directory, endpoint, self.run_size)
+        for logins in self.iter_pages(endpoint):
+            sorter.add(logins)
+            if on_page is not None:
+                on_page(logins)
+        print(f"Streamed {sorter.count} {endpoint}")
+        return sorter.merge()
+
+    def _stream_followers(self):
+        """Fetch followers, queueing the ones not followed back"""
+        try:
+            def on_page(logins):
+                for login in logins:
+                    if login not in self.following:
+                        self._candidates.put(login)
+            self.followers = self._fetch_sorted('followers', on_page)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._candidates.put(_DONE)
+
+    def start(self):
+        """Fetch the following list, then start streaming the followers in the background"""
+        self.following = self._fetch_sorted('following')
+        threading.Thread(target=self._stream_followers, name='follower-stream', daemon=True).start()
+
+    def follow_candidates(self):
+        """Yield followers that are not followed back, while they are being fetched"""
+        while True:
+            login = self._candidates.get()
+            if login is _DONE:
+                break
+            yield login
+        if self._error is not None:
+            raise self._error
+
+    def unfollow_candidates(self):
+        """Yield followed users that do not follow back, once the followers are fetched"""
+        if self.followers is None:
+            # Drain the follower stream if the follow phase did not consume it
+            for _ in self.follow_candidates():
+                pass
+        return only_in(self.following, self.followers)
+
+    def close(self):
+        """Remove the temporary files"""
+        for logins in (self.following, self.followers):
+            if logins is not None:
+                logins.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import RunJournal
+
+def _interrupted_journal(path):
+    """Journal of a killed run: a plan, one finished user and a torn last line"""
+    journal = RunJournal('octocat', path=path)
+    journal.plan('follow', ['a', 'b', 'c', 'd'])
+    journal.record('follow', 'a', True)
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"type": "done", "operation": "fol')
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    _interrupted_journal(path)
+
+    journal = RunJournal('octocat', path=path)
+    assert journal.resumable
+    assert journal.remaining('follow') == ['b', 'c', 'd']
+    journal.close()
+
+def test_resumed_run_after_torn_line_is_replayed(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    _interrupted_journal(path)
+
+    # The resumed run is killed again before it completes
+    journal = RunJournal('octocat', path=path)
+    journal.record('follow', 'b', True)
+    journal.record('follow', 'c', False)
+    journal.mark_reported('follow')
+    journal.close()
+
+    journal = RunJournal('octocat', path=path)
+    assert journal.remaining('follow') == ['d']
+    assert journal.results('follow') == [('follow', 'a', True), ('follow', 'b', True), ('follow', 'c', False)]
+    assert journal.reported == {'follow'}
+    journal.close()